@@ -1,13 +1,16 @@
 from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator
 from datetime import date, datetime, timedelta
 from typing import Generic, TypeVar
 
 from loguru import logger
 
-from course.convert import dayOfWeekToWeekString, isEvenWeek, periodToTime
+from course.convert import dayOfWeekToWeekString, periodToTime
+from course.event_cache import SectionEventCache, sectionEventCache
+from course.term_calendar import TermCalendar
 from ical.ical import Event
-from utils.config import TermConfig, config
-from utils.const import Term, TweakMethod, WeekType
+from utils.config import TermConfig, Tweak
+from utils.const import Term, WeekType
 
 
 def daterange(start: date, end: date):
@@ -16,15 +19,25 @@ def daterange(start: date, end: date):
         yield start + timedelta(n)
 
 
+MAX_WEEK = 63  # 周次位图支持的最大教学周
+
+WEEK_TYPE_MASKS = {
+    WeekType.Normal: sum(1 << w for w in range(1, MAX_WEEK + 1)),
+    WeekType.OddOnly: sum(1 << w for w in range(1, MAX_WEEK + 1, 2)),
+    WeekType.EvenOnly: sum(1 << w for w in range(2, MAX_WEEK + 1, 2)),
+}
+
+
 class Course(ABC):
-    weekType: WeekType
+    weekType: WeekType  # 只用于生成 RRULE 的基础重复规则，实际上课周以 weekMasks 为准
+    weekMasks: dict[Term, int]  # 学期 -> 上课周位图，第 n 位为 1 表示第 n 周上课
     start: int
     end: int
     teacher: str
     classId: str
     name: str
     location: str
-    terms: list[Term]
+    terms: frozenset[Term]
     dayOfWeek: int
     credit: None | float
 
@@ -73,6 +86,9 @@ class Course(ABC):
     def isInTerm(self, term: Term) -> bool:
         return term in self.terms
 
+    def isClassWeek(self, term: Term, weekNo: int) -> bool:
+        return weekNo > 0 and self.weekMasks.get(term, 0) >> weekNo & 1 == 1
+
     def getStartDateTime(self, day: date) -> datetime:
         time = periodToTime(self.start)
         return datetime(day.year, day.month, day.day, time.hour, time.minute)
@@ -83,17 +99,18 @@ class Course(ABC):
         return datetime(day.year, day.month, day.day, time.hour, time.minute) + dt
 
     def setTerms(self, termsStr: str) -> None:
-        self.terms = []
+        terms = set()
         if "春" in termsStr:
-            self.terms.append(Term.Spring)
+            terms.add(Term.Spring)
         if "夏" in termsStr:
-            self.terms.append(Term.Summer)
+            terms.add(Term.Summer)
         if "秋" in termsStr:
-            self.terms.append(Term.Autumn)
+            terms.add(Term.Autumn)
         if "冬" in termsStr:
-            self.terms.append(Term.Winter)
+            terms.add(Term.Winter)
         if any([x not in "春夏秋冬" for x in termsStr]):
             raise NotImplementedError(f"当前学期安排 {termsStr} 不在支持范围内，欢迎提交 PR")
+        self.terms = frozenset(terms)
 
     def printLog(self) -> None:
         weekString = dayOfWeekToWeekString(self.dayOfWeek)
@@ -116,99 +133,159 @@ T = TypeVar("T", bound="Course")
 
 
 class CourseTable(ABC, Generic[T]):
+    eventCache: SectionEventCache = sectionEventCache
+
     def __init__(self) -> None:
         self.courses: list[T] = []
+        self._byTermAndDay: dict[tuple[Term, int], list[T]] = {}  # (学期, 星期几) -> 课程
 
     def __repr__(self) -> str:
         return str(self.courses)
 
     @abstractmethod
     def fromRes(self, res) -> None:
+        """
+        解析课程表，子类在填充 self.courses 之后需要调用 reindex
+        """
         pass
 
-    def GetClassOfDay(self, day: int, term: Term) -> list[T]:
-        res = []
+    def reindex(self) -> None:
+        """
+        重建 (学期, 星期几) -> 课程 的索引，self.courses 变化后需要调用
+        """
+        index: dict[tuple[Term, int], list[T]] = {}
         for course in self.courses:
-            if course.dayOfWeek == day and course.isInTerm(term):
-                res.append(course)
-        return res
+            for term in course.terms:
+                index.setdefault((term, course.dayOfWeek), []).append(course)
+        self._byTermAndDay = index
 
-    def toEvents(self, termConfig: TermConfig) -> list[Event]:
+    def GetClassOfDay(self, day: int, term: Term) -> list[T]:
+        return list(self._byTermAndDay.get((term, day), ()))
+
+    def _termCourses(self, term: Term) -> Iterator[T]:
+        for dayOfWeek in range(1, 8):
+            yield from self._byTermAndDay.get((term, dayOfWeek), ())
+
+    @staticmethod
+    def _sectionKey(course: T) -> tuple:
+        """
+        决定一门课程生成哪些事件的全部字段，相同即可共享生成结果
+        """
+        return (
+            type(course).__name__,
+            course.classId,
+            course.name,
+            course.location,
+            course.description,
+            course.dayOfWeek,
+            course.start,
+            course.end,
+            course.weekType,
+            frozenset(course.weekMasks.items()),
+        )
+
+    def _occurrences(self, course: T, calendar: TermCalendar) -> dict[date, str]:
+        """
+        按日期顺序返回一门课程每次上课的 实际上课日期 -> 描述
+        """
+        term = calendar.termConfig.Term
+        occurrences = {}
+        for day in calendar.daysOfWeek(course.dayOfWeek):
+            if not course.isClassWeek(term, day.weekNo):
+                continue
+
+            description = course.description
+            if day.description is not None:
+                description = day.description + "\\n\\n" + description
+
+            occurrences[day.date] = description
+        return occurrences
+
+    def _cachedEvents(
+        self,
+        kind: str,
+        termConfig: TermConfig,
+        tweaks: Iterable[Tweak],
+        build: Callable[[T, TermCalendar], Iterator[Event]],
+    ) -> Iterator[Event]:
+        calendar = TermCalendar.forTerm(termConfig, tweaks)
+        cache = self.eventCache
+
+        for course in self._termCourses(termConfig.Term):
+            key = (kind, Event.uidHash, calendar.version, self._sectionKey(course))
+            yield from cache.get(key, lambda c=course: tuple(build(c, calendar)))
+
+    def toEvents(self, termConfig: TermConfig, tweaks: Iterable[Tweak]) -> Iterator[Event]:
+        """
+        惰性产出课程表日历事件，按课程逐个生成或取自缓存
+        """
         logger.info("开始生成课程表日历事件")
 
         try:
-            termBegin = termConfig.Begin
-            termEnd = termConfig.End
-
-            oneDay = timedelta(days=1)
-
-            shadowDates = {}
-            modDescriptions = {}
-
-            for d in daterange(termBegin, termEnd + oneDay):
-                shadowDates[d] = d
-
-            tweaks = config.tweaks
-            for tweak in tweaks:
-                if tweak.To < termBegin or tweak.From > termEnd:
-                    continue
-                if tweak.TweakType == TweakMethod.Clear:
-                    for d in daterange(tweak.From, tweak.To + oneDay):
-                        del shadowDates[d]
-                elif tweak.TweakType == TweakMethod.Copy:
-                    shadowDates[tweak.To] = tweak.From
-                    modDescriptions[tweak.To] = tweak.Description
-                elif tweak.TweakType == TweakMethod.Move:
-                    shadowDates[tweak.To] = tweak.From
-                    del shadowDates[tweak.From]
-                    modDescriptions[tweak.From] = tweak.Description
-                elif tweak.TweakType == TweakMethod.Exchange:
-                    shadowDates[tweak.To] = tweak.From
-                    shadowDates[tweak.From] = tweak.To
-                    modDescriptions[tweak.To] = tweak.Description
-                    modDescriptions[tweak.From] = tweak.Description
-                elif tweak.TweakType == TweakMethod.Pending:
-                    pass
-                else:
-                    raise ValueError(f"未知的调整类型: {tweak.TweakType}")
-
-            classOfDay = {}
-            for i in range(1, 8):
-                classOfDay[i] = self.GetClassOfDay(i, termConfig.Term)
-
-            termBeginDayOfWeek = termBegin.weekday() + 1
-            mondayOfFirstWeek = (
-                termBegin
-                - timedelta(days=termBeginDayOfWeek - 1)
-                - timedelta(weeks=termConfig.FirstWeekNo - 1)
+            yield from self._cachedEvents("single", termConfig, tweaks, self._singleEvents)
+        except Exception as e:
+            logger.error(f"课程表日历事件生成失败: {e}")
+            raise e
+
+    def _singleEvents(self, course: T, calendar: TermCalendar) -> Iterator[Event]:
+        for actualDate, description in self._occurrences(course, calendar).items():
+            yield Event(
+                summary=course.name,
+                location=course.location,
+                description=description,
+                start=course.getStartDateTime(actualDate),
+                end=course.getEndDateTime(actualDate),
             )
 
-            events: list[Event] = []
-
-            for actualDate, dateOfClass in shadowDates.items():
-                classesOfCurrentDate = classOfDay[dateOfClass.weekday() + 1]
-                isCurrentDateEvenWeek = isEvenWeek(mondayOfFirstWeek, dateOfClass)
-                for course in classesOfCurrentDate:
-                    if isCurrentDateEvenWeek and course.weekType == WeekType.OddOnly:
-                        continue
-                    if not isCurrentDateEvenWeek and course.weekType == WeekType.EvenOnly:
-                        continue
-
-                    description = course.description
-                    if dateOfClass in modDescriptions:
-                        description = modDescriptions[dateOfClass] + "\\n\\n" + description
-
-                    events.append(
-                        Event(
-                            summary=course.name,
-                            location=course.location,
-                            description=description,
-                            start=course.getStartDateTime(actualDate),
-                            end=course.getEndDateTime(actualDate),
-                        )
-                    )
+    def toRecurringEvents(self, termConfig: TermConfig, tweaks: Iterable[Tweak]) -> Iterator[Event]:
+        """
+        每门课程只生成一个带 RRULE 的重复事件：
+        单双周使用 INTERVAL=2，因调休停课的日期写入 EXDATE，
+        调休补课的日期写入 RDATE，带调休说明的日期生成 RECURRENCE-ID 覆盖事件
+        """
+        logger.info("开始生成课程表重复日历事件")
+
+        try:
+            yield from self._cachedEvents("recurring", termConfig, tweaks, self._recurringEvents)
         except Exception as e:
-            logger.error(f"课程表日历事件生成失败: {e}")
+            logger.error(f"课程表重复日历事件生成失败: {e}")
             raise e
 
-        return events
+    def _recurringEvents(self, course: T, calendar: TermCalendar) -> Iterator[Event]:
+        actual = self._occurrences(course, calendar)
+        if not actual:
+            return
+
+        # 不考虑调休时的上课日期，即 RRULE 展开的结果
+        base = calendar.baseDates(course.dayOfWeek, course.weekType)
+        if not base:
+            yield from self._singleEvents(course, calendar)
+            return
+
+        baseSet = set(base)
+        interval = 1 if course.weekType == WeekType.Normal else 2
+        master = Event(
+            summary=course.name,
+            location=course.location,
+            description=course.description,
+            start=course.getStartDateTime(base[0]),
+            end=course.getEndDateTime(base[0]),
+            rrule=f"FREQ=WEEKLY;INTERVAL={interval};COUNT={len(base)}",
+            rdates=tuple(course.getStartDateTime(d) for d in actual if d not in baseSet),
+            exdates=tuple(course.getStartDateTime(d) for d in base if d not in actual),
+        )
+        yield master
+
+        for actualDate, description in actual.items():
+            if description == master.description:
+                continue
+            start = course.getStartDateTime(actualDate)
+            yield Event(
+                summary=course.name,
+                location=course.location,
+                description=description,
+                start=start,
+                end=course.getEndDateTime(actualDate),
+                recurrenceId=start,
+                recurrenceOf=master.uid,
+            )
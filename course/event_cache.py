@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from collections.abc import Callable
+from threading import Lock
+
+from ical.ical import Event
+from utils.metrics import CACHE_REQUESTS
+
+
+class SectionEventCache:
+    """
+    同一教学班的课程在同一学期日历下生成的事件完全相同，
+    按 (课程标识, 学期日历版本) 缓存生成好的事件，在不同用户之间共享。
+    Event 不可变且会缓存自身的序列化片段，共享后也省去了重复序列化。
+    超出容量时淘汰最久未使用的条目
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[Event, ...]] = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple, build: Callable[[], tuple[Event, ...]]) -> tuple[Event, ...]:
+        with self._lock:
+            events = self._entries.get(key)
+            if events is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.inc(cache="section_events", result="hit")
+                return events
+            self.misses += 1
+        CACHE_REQUESTS.inc(cache="section_events", result="miss")
+
+        # 在锁外生成，并发未命中时可能重复生成，结果相同
+        events = build()
+
+        with self._lock:
+            self._entries[key] = events
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return events
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hitRate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+sectionEventCache = SectionEventCache()
@@ -2,7 +2,7 @@ from loguru import logger
 
 from course.convert import dayOfWeekToWeekString
 from course.course import Course, CourseTable
-from utils.const import WeekType
+from utils.const import Term, WeekType
 
 
 class GRSCourse(Course):
@@ -32,18 +32,39 @@ class GRSCourse(Course):
         self.printLog()
 
     def setWeekType(self, raw: str) -> None:
+        """
+        周次是逗号分隔的教学周列表。全部不超过 8 时为各学期内的周次；
+        否则为整个学年学期（如秋冬）的周次，第 1-8 周属于秋/春学期，第 9-16 周属于冬/夏学期
+        """
         week_list = [int(w) for w in raw.split(",") if w] if raw else []
 
-        # 设置单双周标志
-        threshold = 8 if len(self.terms) > 1 else 4
-        if len(week_list) > threshold:
+        # 单双周标志只决定 RRULE 的基础重复规则，不规则的周次由 EXDATE 排除
+        if week_list and all(w % 2 == 1 for w in week_list):
+            self.weekType = WeekType.OddOnly
+        elif week_list and all(w % 2 == 0 for w in week_list):
+            self.weekType = WeekType.EvenOnly
+        else:
             self.weekType = WeekType.Normal
+
+        if all(w <= 8 for w in week_list):
+            mask = sum(1 << w for w in set(week_list))
+            self.weekMasks = dict.fromkeys(self.terms, mask)
+            return
+
+        halves: dict[int, int] = {}
+        for w in week_list:
+            half = (w - 1) // 8
+            halves[half] = halves.get(half, 0) | 1 << ((w - 1) % 8 + 1)
+
+        if len(self.terms) == 1:
+            (term,) = self.terms
+            mask = 0
+            for m in halves.values():
+                mask |= m
+            self.weekMasks = {term: mask}
         else:
-            odd_week_count = sum(1 for w in week_list if w % 2 == 1)
-            if odd_week_count > len(week_list) / 2:
-                self.weekType = WeekType.OddOnly
-            else:
-                self.weekType = WeekType.EvenOnly
+            terms = sorted(self.terms, key=lambda t: t not in (Term.Autumn, Term.Spring))
+            self.weekMasks = {term: halves.get(i, 0) for i, term in enumerate(terms)}
 
     @property
     def description(self) -> str:
@@ -76,26 +97,27 @@ class GRSCourseTable(CourseTable[GRSCourse]):
                         continue  # 跳过因为调休而单列的课程
                     c = GRSCourse(raw)
                     self.courses.append(c)
+        self.reindex()
 
     def grsGetInfo(self, res: list[dict]) -> None:
+        # 课程编号 -> 附加信息，同一编号以第一条为准
+        infoByClassId: dict[str, dict] = {}
+        for r in res:
+            infoByClassId.setdefault(r.get("kcbh"), r)
+
         for course in self.courses:
-            for r in res:
-                if r.get("kcbh") == course.classId:
-                    course.credit = float(r.get("xf", 0))
-                    course.courseType = str(r.get("kcxzDm") or "")  # 课程性质代码
-                    course.courseType += (
-                        ("(" + str(r.get("bx")) + ")") if r.get("bx") else ""
-                    )  # 必选修
-                    course.comment = str(r.get("bz") or "")  # 备注
-                    course.school = str(r.get("kkxyMc") or "")  # 开课学院名称
-                    if course.location == "" and any(
-                        x in course.comment for x in ["线上", "录播", "直播"]
-                    ):
-                        course.location = "线上"
-                    courseInfo = str(r.get("sjddBz") or "")  # 时间地点备注
-                    course.termInfo = courseInfo.split("<br/>")[0]
-
-                    break
+            r = infoByClassId.get(course.classId)
+            if r is None:
+                continue
+            course.credit = float(r.get("xf", 0))
+            course.courseType = str(r.get("kcxzDm") or "")  # 课程性质代码
+            course.courseType += ("(" + str(r.get("bx")) + ")") if r.get("bx") else ""  # 必选修
+            course.comment = str(r.get("bz") or "")  # 备注
+            course.school = str(r.get("kkxyMc") or "")  # 开课学院名称
+            if course.location == "" and any(x in course.comment for x in ["线上", "录播", "直播"]):
+                course.location = "线上"
+            courseInfo = str(r.get("sjddBz") or "")  # 时间地点备注
+            course.termInfo = courseInfo.split("<br/>")[0]
 
     def deDup(self) -> None:
         logger.info("研究生：开始去重课程表")
@@ -113,6 +135,7 @@ class GRSCourseTable(CourseTable[GRSCourse]):
                 if key not in uniqueCourses:
                     uniqueCourses[key] = course
             self.courses = list(uniqueCourses.values())
+            self.reindex()
         except Exception as e:
             logger.error(f"研究生：课程表去重失败: {e}")
             raise e
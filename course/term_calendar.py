@@ -0,0 +1,165 @@
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import date, timedelta
+from hashlib import sha1
+from threading import Lock
+from typing import ClassVar
+
+from loguru import logger
+
+from utils.config import TermConfig, Tweak
+from utils.const import TweakMethod, WeekType
+from utils.metrics import CACHE_REQUESTS
+
+
+@dataclass(frozen=True, slots=True)
+class TermDay:
+    date: date  # 实际日期
+    sourceDate: date  # 当天按哪一天的课表上课
+    weekNo: int  # sourceDate 所在的教学周
+    isEven: bool  # sourceDate 是否为双周
+    description: str | None  # 调休说明，没有调休时为 None
+
+
+class TermCalendar:
+    """
+    预先编译的学期日历：把学期配置和调休安排展开为逐日的查找表。
+    只依赖学期配置和调休安排，与用户无关，通过 forTerm 在所有用户间共享
+    """
+
+    _cache: ClassVar[dict[tuple, "TermCalendar"]] = {}
+    _lock: ClassVar[Lock] = Lock()
+    maxEntries: ClassVar[int] = 64
+
+    termConfig: TermConfig
+    mondayOfFirstWeek: date
+    termDates: tuple[date, ...]
+    days: tuple[TermDay, ...]
+    version: str
+
+    def __init__(self, termConfig: TermConfig, tweaks: Iterable[Tweak]) -> None:
+        self.termConfig = termConfig
+        self.mondayOfFirstWeek = self._mondayOfFirstWeek(termConfig)
+
+        termBegin = termConfig.Begin
+        termEnd = termConfig.End
+        oneDay = timedelta(days=1)
+
+        self.termDates = tuple(
+            termBegin + timedelta(n) for n in range((termEnd - termBegin).days + 1)
+        )
+
+        shadowDates = {d: d for d in self.termDates}
+        modDescriptions = {}
+
+        tweaks = self.relevantTweaks(termConfig, tweaks)
+        for tweak in tweaks:
+            if tweak.TweakType == TweakMethod.Clear:
+                for n in range((tweak.To - tweak.From).days + 1):
+                    del shadowDates[tweak.From + n * oneDay]
+            elif tweak.TweakType == TweakMethod.Copy:
+                shadowDates[tweak.To] = tweak.From
+                modDescriptions[tweak.To] = tweak.Description
+            elif tweak.TweakType == TweakMethod.Move:
+                shadowDates[tweak.To] = tweak.From
+                del shadowDates[tweak.From]
+                modDescriptions[tweak.From] = tweak.Description
+            elif tweak.TweakType == TweakMethod.Exchange:
+                shadowDates[tweak.To] = tweak.From
+                shadowDates[tweak.From] = tweak.To
+                modDescriptions[tweak.To] = tweak.Description
+                modDescriptions[tweak.From] = tweak.Description
+            elif tweak.TweakType == TweakMethod.Pending:
+                pass
+            else:
+                raise ValueError(f"未知的调整类型: {tweak.TweakType}")
+
+        # 调休说明按上课所依据的日期查找
+        self.days = tuple(
+            TermDay(
+                date=actualDate,
+                sourceDate=sourceDate,
+                weekNo=self.weekNo(sourceDate),
+                isEven=self.isEvenWeek(sourceDate),
+                description=modDescriptions.get(sourceDate),
+            )
+            for actualDate, sourceDate in shadowDates.items()
+        )
+
+        self._daysOfWeek: dict[int, tuple[TermDay, ...]] = {}
+        for i in range(1, 8):
+            self._daysOfWeek[i] = tuple(d for d in self.days if d.sourceDate.weekday() + 1 == i)
+
+        self.version = sha1(repr(self._key(termConfig, tweaks)).encode()).hexdigest()[:16]
+
+    @classmethod
+    def forTerm(cls, termConfig: TermConfig, tweaks: Iterable[Tweak]) -> "TermCalendar":
+        """
+        取得学期日历，相同的学期配置和调休安排只编译一次
+        """
+        tweaks = cls.relevantTweaks(termConfig, tweaks)
+        key = cls._key(termConfig, tweaks)
+
+        with cls._lock:
+            calendar = cls._cache.get(key)
+            CACHE_REQUESTS.inc(cache="term_calendar", result="miss" if calendar is None else "hit")
+            if calendar is None:
+                logger.debug(f"编译 {termConfig.Year} {termConfig.Term.value} 学期日历")
+                calendar = cls(termConfig, tweaks)
+                cls._cache[key] = calendar
+                if len(cls._cache) > cls.maxEntries:
+                    del cls._cache[next(iter(cls._cache))]
+        return calendar
+
+    @staticmethod
+    def relevantTweaks(termConfig: TermConfig, tweaks: Iterable[Tweak]) -> list[Tweak]:
+        return [
+            tweak
+            for tweak in tweaks
+            if not (tweak.To < termConfig.Begin or tweak.From > termConfig.End)
+        ]
+
+    @staticmethod
+    def _key(termConfig: TermConfig, tweaks: Iterable[Tweak]) -> tuple:
+        return (
+            termConfig.Year,
+            termConfig.Term,
+            termConfig.Begin,
+            termConfig.End,
+            termConfig.FirstWeekNo,
+            tuple((t.TweakType, t.Description, t.From, t.To) for t in tweaks),
+        )
+
+    @staticmethod
+    def _mondayOfFirstWeek(termConfig: TermConfig) -> date:
+        termBegin = termConfig.Begin
+        termBeginDayOfWeek = termBegin.weekday() + 1
+        return (
+            termBegin
+            - timedelta(days=termBeginDayOfWeek - 1)
+            - timedelta(weeks=termConfig.FirstWeekNo - 1)
+        )
+
+    def weekNo(self, day: date) -> int:
+        return (day - self.mondayOfFirstWeek).days // 7 + 1
+
+    def isEvenWeek(self, day: date) -> bool:
+        return self.weekNo(day) % 2 == 0
+
+    def daysOfWeek(self, dayOfWeek: int) -> tuple[TermDay, ...]:
+        """
+        按某个星期几的课表上课的全部日期
+        """
+        return self._daysOfWeek[dayOfWeek]
+
+    def baseDates(self, dayOfWeek: int, weekType: WeekType) -> list[date]:
+        """
+        不考虑调休时，某个星期几、某种单双周安排在学期内的全部上课日期
+        """
+        return [
+            d
+            for d in self.termDates
+            if d.weekday() + 1 == dayOfWeek
+            and not (weekType == WeekType.OddOnly and self.isEvenWeek(d))
+            and not (weekType == WeekType.EvenOnly and not self.isEvenWeek(d))
+        ]
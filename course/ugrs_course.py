@@ -1,6 +1,6 @@
 from loguru import logger
 
-from course.course import Course, CourseTable
+from course.course import WEEK_TYPE_MASKS, Course, CourseTable
 from exam.exam import ExamTable
 from utils.const import WeekType
 
@@ -27,6 +27,7 @@ class UGRSCourse(Course):
         # 学期
         xxq: str = raw["xxq"]
         self.setTerms(xxq)
+        self.weekMasks = dict.fromkeys(self.terms, WEEK_TYPE_MASKS[self.weekType])
 
         self.start = int(raw["djj"])  # 第几节
         self.end = self.start + int(raw["skcd"])  # 上课长度
@@ -59,6 +60,7 @@ class UGRSCourseTable(CourseTable[UGRSCourse]):
         for raw in res:
             c = UGRSCourse(raw)
             self.courses.append(c)
+        self.reindex()
 
     def communicate(self, exams: ExamTable) -> None:
         for course in self.courses:
@@ -68,23 +70,51 @@ class UGRSCourseTable(CourseTable[UGRSCourse]):
             course.credit = examsOfCourse[0].credit
 
     def merge(self) -> None:
+        """
+        合并相连或重叠的时段：按 (课号, 星期, 单双周, 地点, 教师) 分组，
+        组内按开始节次排序后线性扫描，合并结果保留在组内最先出现的课程上
+        """
         logger.info("本科生：开始相连时段课程表合并")
         try:
-            to_remove = set()
-            for i in range(len(self.courses)):
-                if i in to_remove:
-                    continue
-                for j in range(i + 1, len(self.courses)):
-                    if j in to_remove:
+            groups: dict[tuple, list[tuple[int, UGRSCourse]]] = {}
+            for idx, course in enumerate(self.courses):
+                key = (
+                    course.classId,
+                    course.dayOfWeek,
+                    course.weekType,
+                    course.location,
+                    course.teacher,
+                )
+                groups.setdefault(key, []).append((idx, course))
+
+            kept: list[tuple[int, UGRSCourse]] = []
+            for group in groups.values():
+                group.sort(key=lambda item: (item[1].start, item[1].end))
+
+                runIdx, runCourse = group[0]
+                start, end = runCourse.start, runCourse.end
+                for idx, course in group[1:]:
+                    if course.start > end:
+                        runCourse.start, runCourse.end = start, end
+                        kept.append((runIdx, runCourse))
+                        runIdx, runCourse = idx, course
+                        start, end = course.start, course.end
                         continue
 
-                    if overlap := self.courses[i].overlap(self.courses[j]):
-                        start, end = overlap
-                        self.courses[i].start = start
-                        self.courses[i].end = end
-                        to_remove.add(j)
+                    if course.start == start and course.end == end:
+                        logger.warning(
+                            f"发现重复课程: {course.name}, 时间: 星期{course.dayOfWeek} {start}-{end}"
+                        )
+                    end = max(end, course.end)
+                    if idx < runIdx:
+                        runIdx, runCourse = idx, course
 
-            self.courses = [c for idx, c in enumerate(self.courses) if idx not in to_remove]
+                runCourse.start, runCourse.end = start, end
+                kept.append((runIdx, runCourse))
+
+            kept.sort(key=lambda item: item[0])
+            self.courses = [course for _, course in kept]
+            self.reindex()
         except Exception as e:
             logger.error(f"本科生：课程表合并失败: {e}")
             raise e
@@ -1,3 +1,4 @@
+from collections.abc import Iterator
 from datetime import datetime
 
 from loguru import logger
@@ -88,6 +89,11 @@ class ExamTable:
 
     def __init__(self) -> None:
         self.exams: list[Exam] = []
+        self._byClassId: dict[str, list[Exam]] = {}  # 选课课号 -> 考试
+
+    def add(self, exam: Exam) -> None:
+        self.exams.append(exam)
+        self._byClassId.setdefault(exam.classId, []).append(exam)
 
     def __repr__(self) -> str:
         return str(self.exams)
@@ -96,28 +102,29 @@ class ExamTable:
         ZDBK = Exam.SCHEME_ZDBK
         for item in raw:
             if "qzkssj" in item:
-                self.exams.append(Exam(item, ZDBK, ExamType.MidTerm))
+                self.add(Exam(item, ZDBK, ExamType.MidTerm))
             if "kssj" in item:
-                self.exams.append(Exam(item, ZDBK, ExamType.FinalTerm))
+                self.add(Exam(item, ZDBK, ExamType.FinalTerm))
             if "qzkssj" not in item and "kssj" not in item:
-                self.exams.append(Exam(item, ZDBK, ExamType.NoExam))
+                self.add(Exam(item, ZDBK, ExamType.NoExam))
+
+    def resetGenerated(self) -> None:
+        """
+        重置考试的事件生成标记，使同一张考试表可以多次生成日历
+        """
+        for exam in self.exams:
+            exam.isEventGenerated = False
 
     def find(self, course: "Course") -> list[Exam]:
         return self.findByClassId(course.classId)
 
     def findByClassId(self, classId: str) -> list[Exam]:
-        res = []
-        for exam in self.exams:
-            if exam.classId == classId:
-                res.append(exam)
-        return res
+        return list(self._byClassId.get(classId, ()))
 
-    def toEvents(self, courses: "CourseTable") -> list[Event]:
+    def toEvents(self, courses: "CourseTable") -> Iterator[Event]:
         logger.info("开始生成考试日历事件")
 
         try:
-            events: list[Event] = []
-
             for course in courses.courses:
                 for exam in self.find(course):
                     if exam.examType == ExamType.NoExam:
@@ -131,17 +138,13 @@ class ExamTable:
                     desc_tail = f"\\n教师: {course.teacher}"
 
                     exam.isEventGenerated = True
-                    events.append(
-                        Event(
-                            summary=exam.summary,
-                            location=exam.locationString,
-                            description=exam.description + desc_tail,
-                            start=exam.start,
-                            end=exam.end,
-                        )
+                    yield Event(
+                        summary=exam.summary,
+                        location=exam.locationString,
+                        description=exam.description + desc_tail,
+                        start=exam.start,
+                        end=exam.end,
                     )
         except Exception as e:
             logger.error(f"考试日历事件生成失败: {e}")
             raise e
-
-        return events
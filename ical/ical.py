@@ -1,70 +1,177 @@
-from dataclasses import dataclass
+import time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
 from datetime import UTC, datetime
-from hashlib import sha1
+from hashlib import blake2b, sha1
+from itertools import chain
+from typing import TYPE_CHECKING, ClassVar, TextIO
 
 from loguru import logger
 
 from course.convert import toISOString
+from utils.profiling import currentSpan
 
+if TYPE_CHECKING:
+    from hashlib import _Hash
 
-@dataclass
+
+UID_HASHES: dict[str, Callable[[bytes], "_Hash"]] = {
+    "sha1": sha1,
+    "blake2b": lambda data: blake2b(data, digest_size=16),
+}
+
+
+@dataclass(frozen=True, slots=True)
 class Event:
     summary: str
     location: str
     description: str
     start: datetime
     end: datetime | None = None
+    rrule: str = ""  # 重复规则，如 FREQ=WEEKLY;INTERVAL=2;COUNT=8
+    rdates: tuple[datetime, ...] = ()  # 额外的重复日期
+    exdates: tuple[datetime, ...] = ()  # 排除的重复日期
+    recurrenceId: datetime | None = None  # 覆盖的重复实例
+    recurrenceOf: str = ""  # 被覆盖的重复事件的 UID
+
+    # 首次访问时计算并缓存，不参与比较
+    _uid: str | None = field(default=None, init=False, repr=False, compare=False)
+    _segments: tuple[str, ...] | None = field(default=None, init=False, repr=False, compare=False)
+
+    uidHash: ClassVar[str] = "sha1"  # UID 使用的哈希算法，见 UID_HASHES
 
     @property
     def uid(self) -> str:
-        m = sha1()
-        m.update(self.description.encode())
-        m.update(self.summary.encode())
-        m.update(self.location.encode())
-        m.update(toISOString(self.start).encode())
-        return m.hexdigest()
+        if self._uid is None:
+            if self.recurrenceOf:
+                uid = self.recurrenceOf
+            else:
+                data = (
+                    self.description + self.summary + self.location + toISOString(self.start)
+                ).encode()
+                uid = UID_HASHES[self.uidHash](data).hexdigest()
+            object.__setattr__(self, "_uid", uid)
+        return self._uid
 
     @property
     def string(self) -> str:
-        utcStr = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+        return self.serialize()
+
+    def serialize(self, stamp: datetime | None = None) -> str:
+        """
+        生成 VEVENT 文本，CREATED/DTSTAMP/LAST-MODIFIED 默认取当前时间，
+        指定 stamp（UTC）时使用该时间，使相同内容得到相同输出
+        """
+        if stamp is None:
+            stamp = datetime.now(UTC)
+        elif stamp.tzinfo is not None:
+            stamp = stamp.astimezone(UTC)
+        utcStr = stamp.strftime("%Y%m%dT%H%M%SZ")
+
+        if self._segments is None:
+            object.__setattr__(self, "_segments", self._buildSegments())
+        return utcStr.join(self._segments)
+
+    def _buildSegments(self) -> tuple[str, ...]:
+        """
+        生成以时间戳为分隔的 VEVENT 文本片段，序列化时只需用时间戳拼接
+        """
         stStr = toISOString(self.start)
 
-        res = f"BEGIN:VEVENT\r\nCLASS:PUBLIC\r\nCREATED:{utcStr}\r\n"
+        res = "BEGIN:VEVENT\r\nCLASS:PUBLIC\r\nCREATED:"
+        segments = [res]
+
+        res = "\r\n"
         if self.description:
             if "=0D=0A" in self.description:
                 res += f"DESCRIPTION;ENCODING=QUOTED-PRINTABLE:{self.description}\r\n"
             else:
                 res += f"DESCRIPTION:{self.description}\r\n"
-        res += f"DTSTAMP:{utcStr}\r\n"
+        res += "DTSTAMP:"
+        segments.append(res)
+
+        res = "\r\n"
         res += f"DTSTART;TZID=Asia/Shanghai:{stStr}\r\n"
         if self.end:
             etStr = toISOString(self.end)
             res += f"DTEND;TZID=Asia/Shanghai:{etStr}\r\n"
+        for exdate in self.exdates:
+            res += f"EXDATE;TZID=Asia/Shanghai:{toISOString(exdate)}\r\n"
+        res += "LAST-MODIFIED:"
+        segments.append(res)
 
-        res += f"LAST-MODIFIED:{utcStr}\r\n"
+        res = "\r\n"
         if self.location:
             res += f"LOCATION:{self.location}\r\n"
+        for rdate in self.rdates:
+            res += f"RDATE;TZID=Asia/Shanghai:{toISOString(rdate)}\r\n"
+        if self.recurrenceId:
+            res += f"RECURRENCE-ID;TZID=Asia/Shanghai:{toISOString(self.recurrenceId)}\r\n"
+        if self.rrule:
+            res += f"RRULE:{self.rrule}\r\n"
         res += f"SEQUENCE:0\r\nSUMMARY;LANGUAGE=zh-cn:{self.summary}\r\nTRANSP:OPAQUE\r\nUID:{self.uid}\r\n"
         res += "END:VEVENT\r\n"
-        return res
+        segments.append(res)
+
+        return tuple(segments)
 
 
 class Calender:
-    events: list[Event]
+    """
+    事件来源可以是惰性的生成器，只在生成日历文件时逐个取出并写入，
+    因此包含生成器的日历只能生成一次
+    """
+
+    name: str
+    stamp: datetime | None
+    eventCount: int
 
-    def __init__(self):
-        self.events = []
+    def __init__(self, name: str = "ZJU-ICAL 课程表", stamp: datetime | None = None):
+        self._sources: list[Iterable[Event]] = []
+        self.name = name
+        self.stamp = stamp  # 固定的 CREATED/DTSTAMP/LAST-MODIFIED 时间，None 表示当前时间
+        self.eventCount = 0  # 最近一次生成日历文件时写出的事件数
+
+    @property
+    def events(self) -> Iterator[Event]:
+        return chain.from_iterable(self._sources)
 
     def add(self, **kwargs) -> None:
-        self.events.append(Event(**kwargs))
+        self._sources.append((Event(**kwargs),))
 
-    def addEvents(self, events: list[Event]) -> None:
-        self.events.extend(events)
+    def addEvents(self, events: Iterable[Event]) -> None:
+        self._sources.append(events)
 
-    def getICS(self, icalName: str = "ZJU-ICAL 课程表") -> str:
+    def iterICS(self, icalName: str | None = None) -> Iterator[str]:
+        """
+        逐段生成日历文件内容，依次产出文件头、每个 VEVENT 以及文件尾
+        """
         logger.info("开始生成日历文件")
-        res = f"BEGIN:VCALENDAR\r\nX-WR-CALNAME:{icalName}\r\nX-APPLE-CALENDAR-COLOR:#2BBFF0\r\nPRODID:-//ZJU-ICAL-PY//Ejector 0.2//EN\r\nVERSION:2.0\r\nMETHOD:PUBLISH\r\nBEGIN:VTIMEZONE\r\nTZID:Asia/Shanghai\r\nBEGIN:STANDARD\r\nDTSTART:16010101T000000\r\nTZOFFSETFROM:+0800\r\nTZOFFSETTO:+0800\r\nEND:STANDARD\r\nEND:VTIMEZONE\r\n"
-        for event in self.events:
-            res += event.string
-        res += "END:VCALENDAR\r\n"
-        return res
+        name = self.name if icalName is None else icalName
+        yield f"BEGIN:VCALENDAR\r\nX-WR-CALNAME:{name}\r\nX-APPLE-CALENDAR-COLOR:#2BBFF0\r\nPRODID:-//ZJU-ICAL-PY//Ejector 0.2//EN\r\nVERSION:2.0\r\nMETHOD:PUBLISH\r\nBEGIN:VTIMEZONE\r\nTZID:Asia/Shanghai\r\nBEGIN:STANDARD\r\nDTSTART:16010101T000000\r\nTZOFFSETFROM:+0800\r\nTZOFFSETTO:+0800\r\nEND:STANDARD\r\nEND:VTIMEZONE\r\n"
+        self.eventCount = 0
+        node = currentSpan()
+        if node is None:
+            for event in self.events:
+                self.eventCount += 1
+                yield event.serialize(self.stamp)
+        else:
+            # 开启性能分析时单独统计序列化耗时，其余为惰性生成事件和写出的耗时
+            serializeTime = 0.0
+            for event in self.events:
+                self.eventCount += 1
+                begin = time.perf_counter()
+                segment = event.serialize(self.stamp)
+                serializeTime += time.perf_counter() - begin
+                yield segment
+            node.attrs.update(events=self.eventCount, serializeSeconds=round(serializeTime, 6))
+        yield "END:VCALENDAR\r\n"
+
+    def writeICS(self, fp: TextIO, icalName: str | None = None) -> None:
+        """
+        将日历文件流式写入文件对象，不在内存中拼接完整内容
+        """
+        fp.writelines(self.iterICS(icalName))
+
+    def getICS(self, icalName: str | None = None) -> str:
+        return "".join(self.iterICS(icalName))
@@ -1,35 +1,54 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
 from loguru import logger
 
+from course.course import CourseTable
+from exam.exam import ExamTable
 from ical.ical import Calender
-from utils.config import ClassYearAndTerm, TermConfig, config
+from todos.todos import TodoTable
+from utils.config import ClassYearAndTerm, ConfigSnapshot, TermConfig, config
+from utils.profiling import span
+from utils.ratelimit import TokenBucket
+from utils.timing import Stopwatch
 from zjuam.base import Zjuam
 from zjuam.grs import GrsZjuam
+from zjuam.response_cache import ResponseCache
+from zjuam.session_cache import SessionCache
 from zjuam.ugrs import UgrsZjuam
 
 
-def getCalender(
+def createZjuam(
     username: str,
     password: str,
     skip_verification_and_use: str | None,
     request_delay: float = 1.5,
-    include_todos: bool = False,
-) -> str:
-    zjuam: Zjuam | None = None
-
+    sessionCache: SessionCache | None = None,
+    limiter: TokenBucket | None = None,
+    responseCache: ResponseCache | None = None,
+) -> Zjuam:
     match username[0]:
         case "3":
             logger.info("检测到本科生学号，使用本科生途径登录")
-            zjuam = UgrsZjuam(username, password, request_delay)
+            return UgrsZjuam(
+                username, password, request_delay, sessionCache, limiter, responseCache
+            )
         case "1" | "2":
             logger.info("检测到研究生学号，使用研究生途径登录")
-            zjuam = GrsZjuam(username, password, request_delay)
+            return GrsZjuam(username, password, request_delay, sessionCache, limiter, responseCache)
         case _:
             if skip_verification_and_use == "ugrs":
                 logger.warning("跳过学号验证，使用本科生途径登录")
-                zjuam = UgrsZjuam(username, password, request_delay)
+                return UgrsZjuam(
+                    username, password, request_delay, sessionCache, limiter, responseCache
+                )
             elif skip_verification_and_use == "grs":
                 logger.warning("跳过学号验证，使用研究生途径登录")
-                zjuam = GrsZjuam(username, password, request_delay)
+                return GrsZjuam(
+                    username, password, request_delay, sessionCache, limiter, responseCache
+                )
             else:
                 logger.error("学号不以 1/2/3 开头，不确保本项目能在除本科生/研究生之外的账号使用")
                 logger.info(
@@ -38,36 +57,169 @@ def getCalender(
                 )
                 raise NotImplementedError("不支持的用户类型")
 
-    zjuam.login()
 
-    termConfigs = config.termConfigs
+@dataclass
+class FetchedData:
+    """
+    获取阶段的结果，生成日历只依赖这些数据和配置快照
+    """
+
+    exams: ExamTable
+    terms: list[tuple[TermConfig, CourseTable]]
+    todos: TodoTable | None
+
 
-    def firstMatchTerm(item: ClassYearAndTerm) -> None | TermConfig:
-        for tc in termConfigs:
-            if tc.Year == item.Year and tc.Term == item.Term:
-                return tc
-        return None
+def fetchData(
+    zjuam: Zjuam,
+    snapshot: ConfigSnapshot,
+    include_todos: bool = False,
+    stopwatch: Stopwatch | None = None,
+    jobs: int = 4,
+) -> FetchedData:
+    """
+    使用已登录的 zjuam（或离线缓存）获取考试、各学期课程和待办事项，
+    jobs 为并行获取的学期数
+    """
+    if stopwatch is None:
+        stopwatch = Stopwatch()
 
-    cal = Calender()
-    exams = zjuam.getExams()
+    with stopwatch.stage("getExams"):
+        exams = zjuam.getExams()
 
-    for item in config.classTerms:
-        tc = firstMatchTerm(item)
+    terms: list[tuple[ClassYearAndTerm, TermConfig]] = []
+    for item in snapshot.classTerms:
+        tc = snapshot.findTermConfig(item.Year, item.Term)
         if tc is None:
             logger.error(f"配置文件错误，未找到 {item.Year}-{item.Term.value} 的学期配置")
             exit(1)
+        terms.append((item, tc))
+
+    now = datetime.now()
+
+    def fetchCourses(item: ClassYearAndTerm, tc: TermConfig) -> CourseTable:
+        # 已结束学期的课程不会再变化
+        termClosed = tc.End + timedelta(days=1)
+        closedSince = termClosed if termClosed <= now else None
+        with stopwatch.stage(f"getCourses[{item.Year}-{item.Term.value}]"):
+            return zjuam.getCourses(item.Year, item.Term, exams, closedSince)
+
+    def fetchTodos() -> TodoTable:
+        with stopwatch.stage("getTodos"):
+            return zjuam.getTodos()
+
+    # 各学期课程与待办事项并行获取，请求频率由 zjuam.limiter 控制。
+    # 每个任务在提交时上下文的副本中执行，性能分析的调用树节点才能挂到当前节点下
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        courseFutures = [
+            executor.submit(copy_context().run, fetchCourses, item, tc) for item, tc in terms
+        ]
+        todosFuture = executor.submit(copy_context().run, fetchTodos) if include_todos else None
+        courseTables = [future.result() for future in courseFutures]
+        todos = todosFuture.result() if todosFuture is not None else None
+
+    return FetchedData(
+        exams=exams,
+        terms=[(tc, courses) for (_, tc), courses in zip(terms, courseTables, strict=True)],
+        todos=todos,
+    )
+
+
+def buildFromData(
+    data: FetchedData,
+    snapshot: ConfigSnapshot,
+    use_rrule: bool = False,
+    deterministic: bool = False,
+) -> Calender:
+    """
+    由已获取的数据和配置快照生成日历，不进行任何网络请求。
+    学期配置以快照中的为准，快照可以比获取数据时使用的更新。
+    事件均为惰性生成，实际在写出日历文件时才逐个生成
+    """
+    cal = Calender(
+        name=snapshot.toTermString() + "课程表",
+        stamp=snapshot.lastUpdated if deterministic else None,
+    )
+    exams = data.exams
+    exams.resetGenerated()
 
-        courses = zjuam.getCourses(item.Year, item.Term, exams)
-        courseEvents = courses.toEvents(termConfig=tc)
-        cal.addEvents(courseEvents)
+    wanted = {(ct.Year, ct.Term) for ct in snapshot.classTerms}
+    for tc, courses in data.terms:
+        if (tc.Year, tc.Term) not in wanted:
+            continue  # 新配置中已移除的学期
+        tc = snapshot.findTermConfig(tc.Year, tc.Term) or tc
+        if use_rrule:
+            cal.addEvents(courses.toRecurringEvents(tc, snapshot.tweaks))
+        else:
+            cal.addEvents(courses.toEvents(tc, snapshot.tweaks))
 
         if exams is not None:
-            examEvents = exams.toEvents(courses)
-            cal.addEvents(examEvents)
+            cal.addEvents(exams.toEvents(courses))
+
+    if data.todos is not None:
+        cal.addEvents(data.todos.toEvents(exams))
+
+    return cal
+
+
+def buildCalender(
+    zjuam: Zjuam,
+    snapshot: ConfigSnapshot,
+    include_todos: bool = False,
+    use_rrule: bool = False,
+    deterministic: bool = False,
+    stopwatch: Stopwatch | None = None,
+    jobs: int = 4,
+) -> Calender:
+    """
+    使用已登录的 zjuam 获取数据并生成日历，stopwatch 用于记录各阶段耗时
+    """
+    if stopwatch is None:
+        stopwatch = Stopwatch()
+
+    data = fetchData(zjuam, snapshot, include_todos, stopwatch, jobs)
+    with span("buildCalendar"):
+        return buildFromData(data, snapshot, use_rrule, deterministic)
+
+
+def getCalender(
+    username: str,
+    password: str,
+    skip_verification_and_use: str | None,
+    request_delay: float = 1.5,
+    include_todos: bool = False,
+    use_rrule: bool = False,
+    deterministic: bool = False,
+    stopwatch: Stopwatch | None = None,
+    session_cache: SessionCache | None = None,
+    jobs: int = 4,
+    response_cache: ResponseCache | None = None,
+    snapshot: ConfigSnapshot | None = None,
+) -> Calender:
+    """
+    response_cache 处于离线模式时不登录，直接使用缓存的数据生成日历；
+    snapshot 为 None 时使用全局配置当前的快照
+    """
+    if stopwatch is None:
+        stopwatch = Stopwatch()
+    if snapshot is None:
+        snapshot = config.snapshot
+
+    # 允许 jobs 个请求连续发出，此后平均每 request_delay 秒一个
+    limiter = TokenBucket(request_delay, jobs)
+    zjuam = createZjuam(
+        username,
+        password,
+        skip_verification_and_use,
+        request_delay,
+        session_cache,
+        limiter,
+        response_cache,
+    )
 
-    if include_todos:
-        todos = zjuam.getTodos()
-        todoEvents = todos.toEvents(exams)
-        cal.addEvents(todoEvents)
+    if response_cache is not None and response_cache.offline:
+        logger.info("离线模式，跳过登录，使用缓存的数据生成日历")
+    else:
+        with stopwatch.stage("login"):
+            zjuam.login()
 
-    return cal.getICS(icalName=config.toTermString() + "课程表")
+    return buildCalender(zjuam, snapshot, include_todos, use_rrule, deterministic, stopwatch, jobs)
@@ -1,3 +1,4 @@
+from collections.abc import Iterator
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -49,8 +50,6 @@ class TodoTable:
             )
             self.todos.append(todo)
 
-    def toEvents(self, exams: ExamTable) -> list[Event]:
-        events = []
+    def toEvents(self, exams: ExamTable) -> Iterator[Event]:
         for todo in self.todos:
-            events.append(todo.toEvent(exams))
-        return events
+            yield todo.toEvent(exams)
@@ -0,0 +1,86 @@
+"""基准测试共用的合成事件和旧版序列化实现"""
+
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from hashlib import sha1
+from typing import Any, Protocol
+
+from course.convert import toISOString
+
+
+class EventLike(Protocol):
+    summary: str
+    location: str
+    description: str
+    start: datetime
+    end: datetime | None
+
+
+def event_fields(count: int) -> Iterator[dict[str, Any]]:
+    """
+    生成 count 个合成课程事件的字段，每天 10 节课，课程名、地点和教师循环重复
+    """
+    begin = datetime(2024, 9, 9, 8, 0)
+    for i in range(count):
+        start = begin + timedelta(days=i // 10, minutes=50 * (i % 10))
+        yield {
+            "summary": f"课程{i % 400}（实验班）",
+            "location": f"紫金港东{i % 5}-{100 + i % 30}",
+            "description": f"教师: 老师{i % 97}\\n学分: 3.0\\n秋冬{{第1-8周}} 第{i % 10 + 1}节",
+            "start": start,
+            "end": start + timedelta(minutes=45),
+        }
+
+
+def legacy_uid(event: EventLike) -> str:
+    # 旧实现的 Event.uid
+    m = sha1()
+    m.update(event.description.encode())
+    m.update(event.summary.encode())
+    m.update(event.location.encode())
+    m.update(toISOString(event.start).encode())
+    return m.hexdigest()
+
+
+def legacy_string(event: EventLike) -> str:
+    # 旧实现的 Event.string：每次调用都重新计算 UID 并拼接全部字段，不做任何缓存
+    utcStr = datetime.now(UTC).strftime("%Y%m%dT%H%M%SZ")
+    stStr = toISOString(event.start)
+
+    res = f"BEGIN:VEVENT\r\nCLASS:PUBLIC\r\nCREATED:{utcStr}\r\n"
+    if event.description:
+        if "=0D=0A" in event.description:
+            res += f"DESCRIPTION;ENCODING=QUOTED-PRINTABLE:{event.description}\r\n"
+        else:
+            res += f"DESCRIPTION:{event.description}\r\n"
+    res += f"DTSTAMP:{utcStr}\r\n"
+    res += f"DTSTART;TZID=Asia/Shanghai:{stStr}\r\n"
+    if event.end:
+        etStr = toISOString(event.end)
+        res += f"DTEND;TZID=Asia/Shanghai:{etStr}\r\n"
+
+    res += f"LAST-MODIFIED:{utcStr}\r\n"
+    if event.location:
+        res += f"LOCATION:{event.location}\r\n"
+    res += f"SEQUENCE:0\r\nSUMMARY;LANGUAGE=zh-cn:{event.summary}\r\nTRANSP:OPAQUE\r\nUID:{legacy_uid(event)}\r\n"
+    res += "END:VEVENT\r\n"
+    return res
+
+
+@dataclass
+class LegacyEvent:
+    # 旧实现：每次访问 uid/string 都重新计算
+    summary: str
+    location: str
+    description: str
+    start: datetime
+    end: datetime | None = None
+
+    @property
+    def uid(self) -> str:
+        return legacy_uid(self)
+
+    @property
+    def string(self) -> str:
+        return legacy_string(self)
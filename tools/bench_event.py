@@ -0,0 +1,59 @@
+"""对比旧版 Event 与缓存 UID/序列化结果的 Event 的内存占用和耗时"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_common import LegacyEvent, event_fields  # noqa: E402
+
+from ical.ical import Event  # noqa: E402
+
+
+def make_events(cls: type, count: int) -> list:
+    return [cls(**fields) for fields in event_fields(count)]
+
+
+def bench(name: str, cls: type, count: int, passes: int) -> None:
+    tracemalloc.start()
+    begin = time.perf_counter()
+    events = make_events(cls, count)
+    built = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    uids = time.perf_counter()
+    for _pass in range(passes):
+        for event in events:
+            _ = event.uid
+    uids = time.perf_counter() - uids
+
+    strings = time.perf_counter()
+    for _pass in range(passes):
+        for event in events:
+            _ = event.string
+    strings = time.perf_counter() - strings
+
+    print(
+        f"{name:>18}: build {(built - begin) * 1000:7.1f} ms ({peak / 1024 / 1024:6.2f} MiB), "
+        f"uid x{passes} {uids * 1000:7.1f} ms, string x{passes} {strings * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark Event uid and serialization")
+    parser.add_argument("-n", "--events", type=int, default=50000, help="number of events")
+    parser.add_argument("-p", "--passes", type=int, default=3, help="accesses per event")
+    args = parser.parse_args()
+
+    bench("legacy", LegacyEvent, args.events, args.passes)
+    for uidHash in ["sha1", "blake2b"]:
+        Event.uidHash = uidHash
+        bench(f"cached ({uidHash})", Event, args.events, args.passes)
+
+
+if __name__ == "__main__":
+    main()
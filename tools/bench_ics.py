@@ -0,0 +1,76 @@
+"""对比日历文件拼接生成与流式写入的耗时和内存峰值"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_common import event_fields, legacy_string  # noqa: E402
+from loguru import logger  # noqa: E402
+
+from ical.ical import Calender  # noqa: E402
+
+
+def make_calender(count: int) -> Calender:
+    cal = Calender()
+    for fields in event_fields(count):
+        cal.add(**fields)
+    return cal
+
+
+def legacy_ics(cal: Calender, path: str) -> None:
+    # 旧实现：逐个事件拼接字符串后一次性写入
+    res = next(iter(cal.iterICS()))
+    for event in cal.events:
+        res += legacy_string(event)
+    res += "END:VCALENDAR\r\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(res)
+
+
+def streaming_ics(cal: Calender, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        cal.writeICS(f)
+
+
+def measure(func: Callable[[Calender, str], None], count: int, path: str) -> tuple[float, int]:
+    # 每次使用新建的事件，避免 Event 缓存的序列化片段在多次重复之间复用
+    cal = make_calender(count)
+    tracemalloc.start()
+    begin = time.perf_counter()
+    func(cal, path)
+    elapsed = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark ICS serialization")
+    parser.add_argument("-n", "--events", type=int, default=20000, help="number of events")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="repeat times")
+    args = parser.parse_args()
+
+    logger.remove()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.ics")
+        for name, func in [("legacy", legacy_ics), ("streaming", streaming_ics)]:
+            results = [measure(func, args.events, path) for _ in range(args.repeat)]
+            elapsed = min(r[0] for r in results)
+            peak = max(r[1] for r in results)
+            size = os.path.getsize(path)
+            print(
+                f"{name:>10}: {elapsed * 1000:8.1f} ms, "
+                f"peak {peak / 1024 / 1024:7.2f} MiB, output {size / 1024 / 1024:.2f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""对比考试表按课号线性查找与哈希索引查找的耗时"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loguru import logger  # noqa: E402
+
+from exam.exam import Exam, ExamTable  # noqa: E402
+
+
+def class_id(i: int) -> str:
+    return f"(2024-2025-1)-{i:06d}-0"[:22]
+
+
+def make_exams(count: int) -> ExamTable:
+    # fromZdbk 对每一行同时生成期中和期末考试，count 场考试需要 count // 2 行
+    raw = []
+    for i in range(max(1, count // 2)):
+        raw.append(
+            {
+                "xkkh": class_id(i) + "094001",
+                "kcmc": f"课程{i}(实验班)",
+                "xf": "3.0",
+                "kssj": f"2025年01月{10 + i % 10:02d}日(08:00-10:00)",
+                "qzkssj": f"2024年11月{10 + i % 10:02d}日(08:00-10:00)",
+            }
+        )
+    table = ExamTable()
+    table.fromZdbk(raw)
+    return table
+
+
+def legacy_find(exams: ExamTable, classId: str) -> list[Exam]:
+    # 旧实现：对整张考试表做线性扫描
+    res = []
+    for exam in exams.exams:
+        if exam.classId == classId:
+            res.append(exam)
+    return res
+
+
+def bench(name: str, exams: ExamTable, courses: list, find) -> None:
+    begin = time.perf_counter()
+    found = 0
+    for course in courses:
+        found += len(find(exams, course.classId))
+    elapsed = time.perf_counter() - begin
+    print(f"{name:>8}: {len(courses)} lookups {elapsed * 1000:9.1f} ms, {found} exams found")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark exam lookups by class id")
+    parser.add_argument(
+        "-n",
+        "--exams",
+        type=int,
+        default=10000,
+        help="number of exams, two per course (midterm and final)",
+    )
+    parser.add_argument("-c", "--courses", type=int, default=2000, help="number of lookups")
+    args = parser.parse_args()
+
+    logger.remove()
+    exams = make_exams(args.exams)
+    # 每隔若干门课取一门，另加一半查不到的课号
+    rows = max(1, args.exams // 2)
+    step = max(1, rows // args.courses)
+    courses = [SimpleNamespace(classId=class_id(i)) for i in range(0, rows * 3 // 2, step)]
+    print(f"{len(exams.exams)} exams in {rows} courses")
+
+    bench("legacy", exams, courses, legacy_find)
+    bench("indexed", exams, courses, ExamTable.findByClassId)
+
+
+if __name__ == "__main__":
+    main()
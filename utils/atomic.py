@@ -0,0 +1,26 @@
+import contextlib
+import os
+import tempfile
+from collections.abc import Iterator
+from typing import IO
+
+
+@contextlib.contextmanager
+def atomicWrite(
+    path: str, mode: str = "w", encoding: str | None = None, permissions: int = 0o644
+) -> Iterator[IO]:
+    """
+    先写入同一目录下的临时文件，写入成功后再原子地替换目标文件，
+    读取方只会看到旧文件或完整的新文件；写入失败时目标文件保持不变
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+        os.chmod(tmp, permissions)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
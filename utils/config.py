@@ -2,8 +2,11 @@ import glob
 import json
 import os
 from collections import defaultdict
-from dataclasses import dataclass
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, replace
 from datetime import datetime
+from threading import Lock
+from typing import ClassVar
 
 from loguru import logger
 
@@ -11,7 +14,7 @@ from course.convert import isoToDate
 from utils.const import Term, TweakMethod
 
 
-@dataclass
+@dataclass(frozen=True)
 class TermConfig:
     Year: str
     Term: Term
@@ -20,7 +23,7 @@ class TermConfig:
     FirstWeekNo: int
 
 
-@dataclass
+@dataclass(frozen=True)
 class Tweak:
     TweakType: TweakMethod
     Description: str
@@ -28,73 +31,113 @@ class Tweak:
     To: datetime
 
 
-@dataclass
+@dataclass(frozen=True)
 class ClassYearAndTerm:
     Year: str
     Term: Term
 
 
-class Config:
-    config: dict
-    lastUpdated: datetime
-    classTerms: list[ClassYearAndTerm]
-    termConfigs: list[TermConfig]
-    tweaks: list[Tweak]
-    is_all: bool = False
+def toTermString(classTerms: Iterable[ClassYearAndTerm]) -> str:
+    terms: defaultdict[str, str] = defaultdict(str)
+    for ct in classTerms:
+        terms[ct.Year] += f"{ct.Term.value}"
+    return ", ".join(f"{year} {terms[year]}" for year in sorted(terms.keys()))
 
-    def __init__(self) -> None:
-        pass
+
+@dataclass(frozen=True)
+class ConfigSnapshot:
+    """
+    一次读取得到的完整配置，创建后不再改变，可以在多个线程间共享
+    """
+
+    raw: dict | None  # 单个配置文件的原始内容，合并多个文件时为 None
+    lastUpdated: datetime
+    classTerms: tuple[ClassYearAndTerm, ...]
+    termConfigs: tuple[TermConfig, ...]
+    tweaks: tuple[Tweak, ...]
+    isAll: bool
+    paths: tuple[str, ...] = ()  # 读取的配置文件（绝对路径）
 
     def toTermString(self) -> str:
-        if self.is_all:
+        if self.isAll:
             return ""
-        return self._toTermString(self.classTerms)
+        return toTermString(self.classTerms)
 
-    @staticmethod
-    def _toTermString(classTerms: list[ClassYearAndTerm]) -> str:
-        terms: defaultdict[str, str] = defaultdict(str)
-        for ct in classTerms:
-            terms[ct.Year] += f"{ct.Term.value}"
-        return ", ".join(f"{year} {terms[year]}" for year in sorted(terms.keys()))
+    def findTermConfig(self, year: str, term: Term) -> TermConfig | None:
+        for tc in self.termConfigs:
+            if tc.Year == year and tc.Term == term:
+                return tc
+        return None
+
+
+ALL_CONFIGS_PATTERN = os.path.join("configs", "config*.json")  # -a 模式读取的配置文件
+
+
+class Config:
+    """
+    持有当前的配置快照，load/loadAll 读取后整体替换快照，
+    已经取得旧快照的调用方不受影响。
+    解析合并后的快照按 (文件路径, 修改时间, 文件大小) 缓存在进程内，
+    配置文件没有变化时不再重新解析
+    """
+
+    maxCompiled: ClassVar[int] = 16
+    _compiled: ClassVar[dict[tuple, ConfigSnapshot]] = {}
+    _compiledLock: ClassVar[Lock] = Lock()
+
+    def __init__(self) -> None:
+        self._snapshot: ConfigSnapshot | None = None
+
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        if self._snapshot is None:
+            raise RuntimeError("配置文件尚未读取")
+        return self._snapshot
+
+    # 以下属性读取当前快照，供尚未显式传递快照的代码使用
+    @property
+    def config(self) -> dict | None:
+        return self.snapshot.raw
+
+    @property
+    def lastUpdated(self) -> datetime:
+        return self.snapshot.lastUpdated
+
+    @property
+    def classTerms(self) -> tuple[ClassYearAndTerm, ...]:
+        return self.snapshot.classTerms
+
+    @property
+    def termConfigs(self) -> tuple[TermConfig, ...]:
+        return self.snapshot.termConfigs
+
+    @property
+    def tweaks(self) -> tuple[Tweak, ...]:
+        return self.snapshot.tweaks
 
-    def load(self, path: str) -> None:
+    @property
+    def is_all(self) -> bool:
+        return self.snapshot.isAll
+
+    def toTermString(self) -> str:
+        return self.snapshot.toTermString()
+
+    def load(self, path: str) -> ConfigSnapshot:
         logger.info("开始读取配置文件")
-        self.is_all = False
 
         if not os.path.exists(path):
             logger.error(f"配置文件 {path} 不存在")
             exit(1)
 
-        self.config = json.load(open(path, encoding="utf-8"))
-        self.lastUpdated = isoToDate(self.config["lastUpdated"])
-        self.classTerms = []
-        self.termConfigs = []
-        self.tweaks = []
-
-        for ct in self.config["classTerms"]:
-            year, term = ct.split(":")
-            term = Term(term)
-            self.classTerms.append(ClassYearAndTerm(year, term))
-
-        for tc in self.config["termConfigs"]:
-            tc["Begin"] = isoToDate(tc["Begin"])
-            tc["End"] = isoToDate(tc["End"])
-            tc["Term"] = Term(tc["Term"])
-            self.termConfigs.append(TermConfig(**tc))
-
-        for tk in self.config["tweaks"]:
-            tk["From"] = isoToDate(tk["From"])
-            tk["To"] = isoToDate(tk["To"])
-            tk["TweakType"] = TweakMethod(tk["TweakType"])
-            self.tweaks.append(Tweak(**tk))
+        self._snapshot = self._compile([path], self._compileOne)
 
         logger.info("配置文件读取处理完成")
+        return self._snapshot
 
-    def loadAll(self) -> None:
+    def loadAll(self) -> ConfigSnapshot:
         logger.info("开始读取所有配置文件")
-        self.is_all = True
 
-        config_files = sorted(glob.glob("configs/config*.json"))
+        config_files = sorted(glob.glob(ALL_CONFIGS_PATTERN))
         if not config_files:
             logger.error("未找到任何 config*.json 文件")
             exit(1)
@@ -103,67 +146,111 @@ class Config:
             f"找到 {len(config_files)} 个配置文件: {', '.join(os.path.basename(f) for f in config_files)}"
         )
 
-        self.classTerms = []
-        self.termConfigs = []
-        self.tweaks = []
+        self._snapshot = self._compile(config_files, self._compileAll)
+
+        logger.info(f"所有配置文件读取处理完成，共合并 {len(self.classTerms)} 个学期")
+        return self._snapshot
+
+    @classmethod
+    def _compile(
+        cls, paths: list[str], build: Callable[[list[str]], ConfigSnapshot]
+    ) -> ConfigSnapshot:
+        stats = [(os.path.abspath(p), os.stat(p)) for p in paths]
+        key = tuple((p, st.st_mtime_ns, st.st_size) for p, st in stats)
+
+        with cls._compiledLock:
+            compiled = cls._compiled.get(key)
+        if compiled is not None:
+            logger.debug("配置文件未变化，使用进程内已解析的配置")
+            return compiled
+
+        compiled = replace(build(paths), paths=tuple(p for p, _ in stats))
+        with cls._compiledLock:
+            cls._compiled[key] = compiled
+            while len(cls._compiled) > cls.maxCompiled:
+                del cls._compiled[next(iter(cls._compiled))]
+        return compiled
+
+    @staticmethod
+    def _parseFile(cfg: dict, isAll: bool = False) -> ConfigSnapshot:
+        classTerms = []
+        termConfigs = []
+        tweaks = []
+
+        for ct in cfg["classTerms"]:
+            year, term = ct.split(":")
+            classTerms.append(ClassYearAndTerm(year, Term(term)))
+
+        for tc in cfg["termConfigs"]:
+            tc = dict(tc)
+            tc["Begin"] = isoToDate(tc["Begin"])
+            tc["End"] = isoToDate(tc["End"])
+            tc["Term"] = Term(tc["Term"])
+            termConfigs.append(TermConfig(**tc))
+
+        for tk in cfg["tweaks"]:
+            tk = dict(tk)
+            tk["From"] = isoToDate(tk["From"])
+            tk["To"] = isoToDate(tk["To"])
+            tk["TweakType"] = TweakMethod(tk["TweakType"])
+            tweaks.append(Tweak(**tk))
+
+        return ConfigSnapshot(
+            raw=cfg,
+            lastUpdated=isoToDate(cfg["lastUpdated"]),
+            classTerms=tuple(classTerms),
+            termConfigs=tuple(termConfigs),
+            tweaks=tuple(tweaks),
+            isAll=isAll,
+        )
+
+    @classmethod
+    def _compileOne(cls, paths: list[str]) -> ConfigSnapshot:
+        (path,) = paths
+        return cls._parseFile(json.load(open(path, encoding="utf-8")))
+
+    @classmethod
+    def _compileAll(cls, paths: list[str]) -> ConfigSnapshot:
+        # 以字典去重，先读到的配置优先
+        classTerms: dict[tuple[str, Term], ClassYearAndTerm] = {}
+        termConfigs: dict[tuple[str, Term], TermConfig] = {}
+        tweaks: dict[tuple[datetime, datetime, TweakMethod], Tweak] = {}
         latest_update = None
 
-        for config_file in config_files:
+        for config_file in paths:
             assert os.path.exists(config_file), f"配置文件 {config_file} 不存在，怎么可能？？"
 
-            cfg = json.load(open(config_file, encoding="utf-8"))
-
-            file_updated = isoToDate(cfg["lastUpdated"])
-            if latest_update is None or file_updated > latest_update:
-                latest_update = file_updated
+            cfg = cls._parseFile(json.load(open(config_file, encoding="utf-8")))
 
-            thisClassTerms: list[ClassYearAndTerm] = []
+            if latest_update is None or cfg.lastUpdated > latest_update:
+                latest_update = cfg.lastUpdated
 
             # Merge classTerms
-            for ct in cfg["classTerms"]:
-                year, term = ct.split(":")
-                term_obj = Term(term)
-                class_term = ClassYearAndTerm(year, term_obj)
-                if class_term not in self.classTerms:
-                    thisClassTerms.append(class_term)
-
-            self.classTerms.extend(thisClassTerms)
+            thisClassTerms: list[ClassYearAndTerm] = []
+            for ct in cfg.classTerms:
+                if (ct.Year, ct.Term) not in classTerms:
+                    classTerms[(ct.Year, ct.Term)] = ct
+                    thisClassTerms.append(ct)
             logger.info(
-                f"合并来自 {os.path.basename(config_file)} 的 {self._toTermString(thisClassTerms)}学期"
+                f"合并来自 {os.path.basename(config_file)} 的 {toTermString(thisClassTerms)}学期"
             )
 
             # Merge termConfigs
-            for tc in cfg["termConfigs"]:
-                tc["Begin"] = isoToDate(tc["Begin"])
-                tc["End"] = isoToDate(tc["End"])
-                tc["Term"] = Term(tc["Term"])
-                term_config = TermConfig(**tc)
-
-                # Check existing termConfigs
-                if not any(
-                    existing.Year == term_config.Year and existing.Term == term_config.Term
-                    for existing in self.termConfigs
-                ):
-                    self.termConfigs.append(term_config)
+            for tc in cfg.termConfigs:
+                termConfigs.setdefault((tc.Year, tc.Term), tc)
 
             # Merge tweaks
-            for tk in cfg["tweaks"]:
-                tk["From"] = isoToDate(tk["From"])
-                tk["To"] = isoToDate(tk["To"])
-                tk["TweakType"] = TweakMethod(tk["TweakType"])
-                tweak = Tweak(**tk)
-
-                # Check existing tweaks
-                if not any(
-                    existing.From == tweak.From
-                    and existing.To == tweak.To
-                    and existing.TweakType == tweak.TweakType
-                    for existing in self.tweaks
-                ):
-                    self.tweaks.append(tweak)
-
-        self.lastUpdated = latest_update if latest_update else datetime.now()
-        logger.info(f"所有配置文件读取处理完成，共合并 {len(self.classTerms)} 个学期")
+            for tk in cfg.tweaks:
+                tweaks.setdefault((tk.From, tk.To, tk.TweakType), tk)
+
+        return ConfigSnapshot(
+            raw=None,
+            lastUpdated=latest_update if latest_update else datetime.now(),
+            classTerms=tuple(classTerms.values()),
+            termConfigs=tuple(termConfigs.values()),
+            tweaks=tuple(tweaks.values()),
+            isAll=True,
+        )
 
 
 config = Config()
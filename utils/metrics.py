@@ -0,0 +1,157 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+from collections.abc import Iterable, Iterator
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values, strict=True)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    """
+    Prometheus 文本格式的指标，按标签值分别统计，可在多个线程中使用
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield from self._samples()
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]:
+        pass
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        # 标签值 -> (各桶计数, 总和, 总数)
+        self._values: dict[tuple[str, ...], tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, (list(c), s, n)) for key, (c, s, n) in self._values.items()]
+        for key, (counts, total, count) in values:
+            for bound, bucketCount in zip(self.buckets, counts, strict=True):
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, le)} {bucketCount}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+
+    def register(self, metric: Metric) -> None:
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = Histogram(
+    "zjuical_stage_seconds", "Duration of calendar generation stages", ["stage"]
+)
+REFRESH_SECONDS = Histogram(
+    "zjuical_refresh_seconds", "Duration of whole calendar refreshes", ["calendar"]
+)
+REFRESHES = Counter(
+    "zjuical_refreshes_total", "Calendar refreshes by result", ["calendar", "result"]
+)
+UPSTREAM_REQUESTS = Counter(
+    "zjuical_upstream_requests_total", "Upstream HTTP requests by URL and status", ["url", "status"]
+)
+UPSTREAM_SECONDS = Histogram(
+    "zjuical_upstream_request_seconds", "Latency of upstream HTTP requests", ["url"]
+)
+CACHE_REQUESTS = Counter(
+    "zjuical_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"]
+)
+ICS_BYTES = Gauge("zjuical_ics_bytes", "Size of the latest serialized calendar", ["calendar"])
+ICS_EVENTS = Gauge("zjuical_ics_events", "Events in the latest serialized calendar", ["calendar"])
+HTTP_REQUESTS = Counter(
+    "zjuical_http_requests_total", "Served HTTP requests by route and status", ["route", "status"]
+)
+HTTP_SECONDS = Histogram(
+    "zjuical_http_request_seconds", "Latency of served HTTP requests", ["route"]
+)
@@ -0,0 +1,133 @@
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from loguru import logger
+
+
+class Span:
+    """
+    调用树中的一个节点，记录开始时间（相对于根节点，秒）、耗时、属性和子节点
+    """
+
+    def __init__(self, name: str, origin: float, attrs: dict[str, Any]) -> None:
+        self.name = name
+        self.origin = origin
+        self.start = time.perf_counter() - origin
+        self.duration: float | None = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+        self.children: list[Span] = []
+        self._lock = threading.Lock()  # 并行的子任务可能同时添加子节点
+
+    def child(self, name: str, attrs: dict[str, Any]) -> "Span":
+        node = Span(name, self.origin, attrs)
+        with self._lock:
+            self.children.append(node)
+        return node
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.origin - self.start
+
+    def toDict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration": None if self.duration is None else round(self.duration, 6),
+            "thread": self.thread,
+            "attrs": self.attrs,
+            "children": [child.toDict() for child in self.children],
+        }
+
+
+# 当前所在的节点，未开启性能分析时为 None。
+# 提交到线程池的任务需通过 contextvars.copy_context().run 执行才能挂到提交者的节点下
+_current: ContextVar[Span | None] = ContextVar("span", default=None)
+
+
+def currentSpan() -> Span | None:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span | None]:
+    """
+    在当前节点下记录一个子节点，未开启性能分析时不做任何事。
+    产出的节点可用于在执行过程中补充属性
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    node = parent.child(name, attrs)
+    token = _current.set(node)
+    try:
+        yield node
+    except BaseException as e:
+        node.attrs["error"] = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        node.finish()
+
+
+class Profiler:
+    """
+    记录一次运行的调用树，可同时开启 cProfile 或 tracemalloc。
+    cProfile 只统计开启它的线程，需要完整的函数级统计时可配合 -j 1 使用
+    """
+
+    def __init__(self, name: str, useCProfile: bool = False, useTracemalloc: bool = False):
+        self.name = name
+        self.root: Span | None = None
+        self.profile = cProfile.Profile() if useCProfile else None
+        self.useTracemalloc = useTracemalloc
+        self.snapshot: tracemalloc.Snapshot | None = None
+        self._token = None
+
+    def __enter__(self) -> "Profiler":
+        self.root = Span(self.name, time.perf_counter(), {})
+        self._token = _current.set(self.root)
+        if self.useTracemalloc:
+            tracemalloc.start()
+        if self.profile is not None:
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        assert self.root is not None and self._token is not None
+        if self.profile is not None:
+            self.profile.disable()
+        if self.useTracemalloc:
+            current, peak = tracemalloc.get_traced_memory()
+            self.root.attrs.update(memoryCurrent=current, memoryPeak=peak)
+            self.snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        _current.reset(self._token)
+        self.root.finish()
+
+    def dump(self, path: str) -> None:
+        """
+        将调用树写入 path（JSON），cProfile 和 tracemalloc 的结果分别写入同名的
+        .prof（可用 pstats / snakeviz 查看）和 .tracemalloc（可用 tracemalloc.Snapshot.load 读取）
+        """
+        assert self.root is not None
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.root.toDict(), f, ensure_ascii=False, indent=2)
+        logger.info(f"调用树已写入 {path}")
+
+        base = os.path.splitext(path)[0]
+        if self.profile is not None:
+            self.profile.dump_stats(f"{base}.prof")
+            logger.info(f"cProfile 统计已写入 {base}.prof")
+        if self.snapshot is not None:
+            self.snapshot.dump(f"{base}.tracemalloc")
+            logger.info(f"tracemalloc 快照已写入 {base}.tracemalloc")
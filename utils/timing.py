@@ -0,0 +1,43 @@
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from utils.metrics import STAGE_SECONDS
+from utils.profiling import span
+
+
+class Stopwatch:
+    """
+    记录各阶段耗时（秒），同名阶段的耗时累加，可在多个线程中使用。
+    每个阶段的耗时同时计入 /metrics 的 zjuical_stage_seconds，开启性能分析时还会记录为调用树节点
+    """
+
+    stages: dict[str, float]
+
+    def __init__(self) -> None:
+        self.stages = {}
+        self.begin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        begin = time.perf_counter()
+        try:
+            with span(name):
+                yield
+        finally:
+            elapsed = time.perf_counter() - begin
+            STAGE_SECONDS.observe(elapsed, stage=name)
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    @property
+    def total(self) -> float:
+        """
+        自创建以来经过的时间，阶段并行执行时小于各阶段耗时之和
+        """
+        return time.perf_counter() - self.begin
+
+    def summary(self) -> str:
+        return ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in self.stages.items())
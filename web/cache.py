@@ -0,0 +1,87 @@
+import gzip
+import threading
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from hashlib import sha256
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只提供 gzip
+    brotli = None
+
+
+def compressVariants(content: bytes) -> dict[str, bytes]:
+    """
+    预先压缩日历内容，返回 Content-Encoding -> 压缩后的内容
+    """
+    # mtime=0 使相同内容的压缩结果完全相同
+    variants = {"gzip": gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(content, mode=brotli.MODE_TEXT)
+    return variants
+
+
+@dataclass(frozen=True)
+class CalendarVersion:
+    content: bytes
+    etag: str  # 内容的 SHA-256，作为强 ETag
+    lastModified: datetime  # 内容最近一次变化的时间（UTC，精确到秒）
+    variants: dict[str, bytes] = field(default_factory=dict)  # 预压缩的内容
+
+    def encoded(self, encoding: str | None) -> tuple[bytes, str]:
+        """
+        返回指定编码的内容及其 ETag，不同编码的 ETag 互不相同
+        """
+        if encoding is None or encoding not in self.variants:
+            return self.content, self.etag
+        return self.variants[encoding], f"{self.etag}-{encoding}"
+
+
+class CalendarCache:
+    """
+    在内存中保存最新的日历文件，只有内容变化时才替换版本。
+    刷新期间或刷新失败时继续提供上一个成功生成的版本，读取版本不需要加锁
+    """
+
+    _version: CalendarVersion | None
+    refreshedAt: datetime | None  # 最近一次成功生成的时间，内容未变化时也会更新
+
+    def __init__(self) -> None:
+        self._version = None
+        self.refreshedAt = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> CalendarVersion | None:
+        return self._version
+
+    @property
+    def age(self) -> float | None:
+        """
+        当前版本距最近一次成功生成的秒数
+        """
+        refreshedAt = self.refreshedAt
+        if refreshedAt is None:
+            return None
+        return max(0.0, (datetime.now(UTC) - refreshedAt).total_seconds())
+
+    def update(self, content: bytes, lastModified: datetime | None = None) -> bool:
+        """
+        更新缓存内容，返回内容是否发生变化
+        """
+        etag = sha256(content).hexdigest()
+        if lastModified is None:
+            lastModified = datetime.now(UTC)
+        current = self._version
+        if current is not None and current.etag == etag:
+            self.refreshedAt = lastModified
+            return False
+
+        # 每个版本只压缩一次，在锁外进行
+        variants = compressVariants(content)
+        with self._lock:
+            self.refreshedAt = lastModified
+            self._version = CalendarVersion(
+                content, etag, lastModified.replace(microsecond=0), variants
+            )
+        return True
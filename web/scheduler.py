@@ -0,0 +1,75 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+from web.tenants import Tenant
+
+
+class RefreshScheduler:
+    """
+    所有用户共用的刷新调度器：到期的用户交给固定大小的线程池刷新，
+    刷新时间加入随机抖动，避免所有用户同时登录 ZJUAM
+    """
+
+    def __init__(self, interval: float, jitter: float, workers: int):
+        self.interval = interval
+        self.jitter = jitter
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="refresh")
+        self._heap: list[tuple[float, int, Tenant]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def add(self, tenant: Tenant, delay: float) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), tenant))
+            self._cond.notify()
+
+    def start(self, tenants: list[Tenant]) -> None:
+        for tenant in tenants:
+            # 首次刷新分散在 [0, jitter] 内
+            self.add(tenant, random.uniform(0, self.jitter))
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _nextDelay(self) -> float:
+        return max(0.0, self.interval + random.uniform(-self.jitter, self.jitter) / 2)
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, tenant = heapq.heappop(self._heap)
+            self.executor.submit(self._refresh, tenant)
+
+    def _refresh(self, tenant: Tenant) -> None:
+        try:
+            stopwatch = tenant.worker.run()
+            logger.success(
+                f"[{tenant.name}] 日历生成完毕，共耗时 {stopwatch.total:.2f}s: {stopwatch.summary()}"
+            )
+        except (Exception, SystemExit) as e:
+            logger.error(f"[{tenant.name}] 日历生成失败: {e!r}")
+        finally:
+            self.add(tenant, self._nextDelay())
+
+    def runEvery(self, interval: float, task: Callable[[], None]) -> None:
+        """
+        在单独的线程中周期性执行与用户无关的任务
+        """
+
+        def loop() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    task()
+                except (Exception, SystemExit) as e:
+                    logger.error(f"Periodic task 错误: {e!r}")
+
+        threading.Thread(target=loop, daemon=True).start()
@@ -0,0 +1,68 @@
+import json
+import os
+from dataclasses import dataclass
+
+from loguru import logger
+
+from web.cache import CalendarCache
+from web.worker import CalendarWorker, parseZjuicalArgs
+
+
+@dataclass
+class Tenant:
+    name: str
+    token: str  # 订阅链接中的密钥
+    worker: CalendarWorker
+
+
+def loadTenants(path: str) -> list[Tenant]:
+    """
+    读取多用户配置文件，格式为：
+
+    {
+        "args": "-a --include-todos",
+        "users": [{"name": "...", "token": "...", "args": "-u ... -p ..."}]
+    }
+
+    其中 args 为共用参数，每个用户的 args 追加在其后，name 可省略
+    """
+    if not os.path.exists(path):
+        logger.error(f"多用户配置文件 {path} 不存在")
+        exit(1)
+
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    sharedArgs: str = raw.get("args", "")
+
+    tenants: list[Tenant] = []
+    tokens: set[str] = set()
+    for index, user in enumerate(raw["users"]):
+        token = user.get("token")
+        if not token or token in tokens:
+            logger.error(f"多用户配置文件中的 token 缺失或重复: {user.get('name', '')}")
+            exit(1)
+        tokens.add(token)
+
+        args = parseZjuicalArgs(f"{sharedArgs} {user['args']}")
+        # UID 哈希算法是进程内全局的设置，按解析后的值检查（参数可能被缩写），所有用户必须相同
+        if tenants and args.uid_hash != tenants[0].worker.args.uid_hash:
+            logger.error(
+                f"所有用户的 --uid-hash 必须相同，请只在共用参数 args 中设置: {user.get('name', args.username)}"
+            )
+            exit(1)
+        # /metrics 中的标签，未设置 name 时按序号标记，不使用学号或 token
+        label = user.get("name", f"user{index}")
+        tenants.append(
+            Tenant(
+                name=user.get("name", args.username),
+                token=token,
+                worker=CalendarWorker(args, CalendarCache(), name=label),
+            )
+        )
+
+    if not tenants:
+        logger.error(f"多用户配置文件 {path} 中没有任何用户")
+        exit(1)
+
+    logger.info(f"共读取 {len(tenants)} 个用户")
+    return tenants
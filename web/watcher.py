@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+
+from loguru import logger
+
+
+class ConfigWatcher:
+    """
+    轮询一组配置文件，有文件新增、删除或修改（按修改时间和大小判断）时，
+    以发生变化的文件（绝对路径）调用回调。
+    要监视的文件在每次检查时由 paths 重新取得，可随各日历使用的配置而变化
+    """
+
+    def __init__(self, paths: Callable[[], Iterable[str]], interval: float = 5.0):
+        self.paths = paths
+        self.interval = interval
+        self._files = self._scan(self.paths())
+
+    @staticmethod
+    def _scan(paths: Iterable[str]) -> dict[str, tuple[int, int] | None]:
+        files: dict[str, tuple[int, int] | None] = {}
+        for path in paths:
+            path = os.path.abspath(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                files[path] = None  # 已被删除
+                continue
+            files[path] = (st.st_mtime_ns, st.st_size)
+        return files
+
+    def poll(self) -> set[str]:
+        """
+        检查一次配置文件，返回与上一次检查相比发生变化的文件
+        """
+        # 上一次监视的文件这次也要检查，才能发现被删除的文件
+        files = self._scan({*self.paths(), *self._files})
+        changed = {path for path in files if files[path] != self._files.get(path)}
+        # 已删除的文件记录一次后不再监视
+        self._files = {path: state for path, state in files.items() if state is not None}
+        if changed:
+            names = ", ".join(sorted(os.path.basename(path) for path in changed))
+            logger.info(f"检测到配置文件变化: {names}")
+        return changed
+
+    def start(self, callback: Callable[[set[str]], None]) -> None:
+        def loop() -> None:
+            while True:
+                time.sleep(self.interval)
+                try:
+                    changed = self.poll()
+                    if changed:
+                        callback(changed)
+                except (Exception, SystemExit) as e:
+                    logger.error(f"配置文件重新加载失败: {e!r}")
+
+        threading.Thread(target=loop, daemon=True).start()
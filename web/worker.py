@@ -0,0 +1,148 @@
+import argparse
+import glob
+import io
+import os
+import shlex
+import threading
+from datetime import UTC, datetime
+
+from loguru import logger
+
+from main.integration import FetchedData, buildFromData, createZjuam, fetchData
+from utils.atomic import atomicWrite
+from utils.config import ALL_CONFIGS_PATTERN, Config, ConfigSnapshot, config
+from utils.metrics import ICS_BYTES, ICS_EVENTS, REFRESH_SECONDS, REFRESHES
+from utils.ratelimit import TokenBucket
+from utils.timing import Stopwatch
+from web.cache import CalendarCache
+from zjuical import createResponseCache, createSessionCache, parse_args
+
+
+def parseZjuicalArgs(zjuicalArgs: str) -> argparse.Namespace:
+    args = parse_args(shlex.split(zjuicalArgs))
+    # 内容不变时输出也不变，缓存和 ETag 才能生效
+    args.deterministic = True
+    return args
+
+
+def loadConfig(args: argparse.Namespace, holder: Config = config) -> ConfigSnapshot:
+    if args.all:
+        return holder.loadAll()
+    return holder.load(args.config)
+
+
+class CalendarWorker:
+    """
+    在当前进程内生成日历，在多次运行之间复用已登录的 HTTP 会话，会话被服务器拒绝时才重新登录。
+    每次运行开始时重新读取配置（未变化时直接取缓存），整次运行使用同一个配置快照；
+    获取到的数据保留下来，配置文件变化时由 reload 直接重新生成日历
+    """
+
+    def __init__(
+        self,
+        args: argparse.Namespace,
+        cache: CalendarCache,
+        output: str | None = None,
+        name: str = "default",
+    ):
+        self.args = args
+        self.cache = cache
+        self.output = output  # 为 None 时只保存在内存中
+        # /metrics 中的日历标签，/metrics 无需认证，不能使用学号等可识别用户的信息
+        self.name = name
+        self.config = Config()
+        self.snapshot: ConfigSnapshot | None = None  # 当前日历使用的配置快照
+        self.data: FetchedData | None = None  # 最近一次获取的数据
+        self._lock = threading.Lock()  # run 与 reload 互斥
+        self.zjuam = createZjuam(
+            self.args.username,
+            self.args.password,
+            self.args.skip_verification_and_use,
+            self.args.delay,
+            createSessionCache(self.args),
+            TokenBucket(self.args.delay, self.args.jobs),
+            createResponseCache(self.args),
+        )
+
+    def run(self) -> Stopwatch:
+        with self._lock:
+            stopwatch = Stopwatch()
+            try:
+                snapshot = loadConfig(self.args, self.config)
+                if not self.args.offline:
+                    with stopwatch.stage("login"):
+                        self.zjuam.keepAlive()
+                self.data = fetchData(
+                    self.zjuam, snapshot, self.args.include_todos, stopwatch, self.args.jobs
+                )
+                self._publish(snapshot, stopwatch)
+            except BaseException:
+                REFRESHES.inc(calendar=self.name, result="error")
+                raise
+            REFRESHES.inc(calendar=self.name, result="success")
+            REFRESH_SECONDS.observe(stopwatch.total, calendar=self.name)
+            return stopwatch
+
+    def watchedPaths(self) -> set[str]:
+        """
+        影响本日历的配置文件（绝对路径）：当前快照读取的文件，
+        -a 模式下还包括之后新增的 config*.json
+        """
+        paths = set(self.snapshot.paths) if self.snapshot is not None else set()
+        if self.args.all:
+            paths.update(glob.glob(ALL_CONFIGS_PATTERN))
+        else:
+            paths.add(self.args.config)
+        return {os.path.abspath(path) for path in paths}
+
+    def reload(self) -> Stopwatch | None:
+        """
+        配置文件变化后，用上一次获取的数据按新配置重新生成日历，不请求上游。
+        未变化的学期直接复用已编译的学期日历和课程事件缓存。
+        尚未获取过数据或配置没有变化时返回 None
+        """
+        with self._lock:
+            if self.data is None:
+                return None
+            snapshot = loadConfig(self.args, self.config)
+            if snapshot is self.snapshot:
+                return None
+
+            fetched = {(tc.Year, tc.Term) for tc, _ in self.data.terms}
+            for ct in snapshot.classTerms:
+                if (ct.Year, ct.Term) not in fetched:
+                    logger.info(f"新增的 {ct.Year}-{ct.Term.value} 学期课程将在下次刷新时获取")
+
+            stopwatch = Stopwatch()
+            self._publish(snapshot, stopwatch)
+            return stopwatch
+
+    def _publish(self, snapshot: ConfigSnapshot, stopwatch: Stopwatch) -> None:
+        assert self.data is not None
+        cal = buildFromData(self.data, snapshot, self.args.rrule, self.args.deterministic)
+        with stopwatch.stage("toICS"):
+            buffer = io.StringIO()
+            cal.writeICS(buffer)
+            content = buffer.getvalue().encode("utf-8")
+        self.snapshot = snapshot
+        ICS_BYTES.set(len(content), calendar=self.name)
+        ICS_EVENTS.set(cal.eventCount, calendar=self.name)
+
+        if not self.cache.update(content):
+            logger.info("日历内容未变化，跳过写入")
+        elif self.output is not None:
+            with atomicWrite(self.output, "wb") as f:
+                logger.info(f"日历内容已更新，正在写入文件 {self.output}")
+                f.write(content)
+
+    def loadExisting(self) -> None:
+        """
+        读取上一次生成的文件，使服务启动后在首次生成完成前也能返回日历
+        """
+        if self.output is None or not os.path.exists(self.output):
+            return
+        with open(self.output, "rb") as f:
+            content = f.read()
+        mtime = datetime.fromtimestamp(os.path.getmtime(self.output), UTC)
+        self.cache.update(content, lastModified=mtime)
+        logger.info(f"已载入现有日历文件 {self.output}")
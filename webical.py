@@ -1,15 +1,24 @@
 import argparse
-import shlex
 import subprocess
-import sys
 import threading
 import time
 
-from flask import Flask, Response
+from flask import Flask, Response, abort, g, request
 from loguru import logger
 from waitress import serve
 
+from ical.ical import Event
+from utils.metrics import HTTP_REQUESTS, HTTP_SECONDS, registry
+from web.cache import CalendarCache
+from web.scheduler import RefreshScheduler
+from web.tenants import Tenant, loadTenants
+from web.watcher import ConfigWatcher
+from web.worker import CalendarWorker, loadConfig, parseZjuicalArgs
+from zjuam.session import ZjuamSession
+
 app = Flask(__name__)
+cache = CalendarCache()
+tenants: dict[str, Tenant] = {}  # token -> Tenant
 VERSION = "1.0.0"
 INTERVAL = 60 * 60  # 1 hour
 
@@ -21,7 +30,7 @@ def parse_args():
     parser = argparse.ArgumentParser(
         prog="webical.py",
         description="Web server for ZJU-ICAL-PY that performs \
-            code & data updates automatically every hour, and \
+            config & data updates automatically every hour, and \
             serves the latest iCalendar file.",
         formatter_class=formatter,
     )
@@ -47,59 +56,207 @@ def parse_args():
         version=f"%(prog)s v{VERSION}",
         help="version for zjuical web server",
     )
+    parse(
+        "--tenants",
+        type=str,
+        help="JSON file listing multiple accounts, each served at /u/[token].ics (multi-tenant mode)",
+    )
+    parse(
+        "--workers",
+        type=int,
+        default=4,
+        help="number of calendars refreshed in parallel in multi-tenant mode (default 4)",
+    )
+    parse(
+        "--jitter",
+        type=float,
+        default=600,
+        help="random spread in seconds of refresh times in multi-tenant mode (default 600)",
+    )
+    parse(
+        "--max-upstream",
+        type=int,
+        default=8,
+        help="max concurrent upstream requests across all accounts (default 8, 0 for unlimited)",
+    )
+    parse(
+        "--watch-interval",
+        type=float,
+        default=5,
+        help="seconds between checks of configs/ for changed config files, "
+        "which rebuild calendars from already-fetched data (default 5, 0 to disable)",
+    )
     parse(
         "zjuical",
         type=str,
+        nargs="?",
         help="arguments for zjuical.py, e.g. '-u [username] -p [password]'",
     )
 
-    return parser.parse_args()
+    args = parser.parse_args()
+    if (args.zjuical is None) == (args.tenants is None):
+        parser.error("either zjuical arguments or --tenants is required, but not both")
+    return args
+
+
+def git_head() -> str:
+    result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip()
 
 
-def git_pull():
+def git_pull() -> bool:
+    """
+    更新源代码，返回 HEAD 是否发生变化
+    """
     logger.info("执行 Git pull 命令以更新源代码...")
+    before = git_head()
     result = subprocess.run(["git", "pull"], capture_output=True, text=True)
     logger.info(f"Git pull 输出: {result.stdout.strip()}")
     if result.returncode != 0:
         logger.error(f"Git pull 失败: {result.stderr.strip()}")
-    else:
-        logger.success("Git pull 成功")
-
-
-def run_zjuical(zjuical_args: str):
-    executable = sys.executable
-    cmd = [executable, "zjuical.py"] + shlex.split(zjuical_args)
-    logger.info("启动 zjuical.py...")
-    print()
-    subprocess.run(cmd)
-    print()
-    logger.info("zjuical.py 执行完毕")
+        return False
+    logger.success("Git pull 成功")
+    return git_head() != before
 
 
-def periodic_task(zjuical_args: str):
+def periodic_task(worker: CalendarWorker):
     while True:
         try:
-            git_pull()
-            run_zjuical(zjuical_args)
-        except Exception as e:
-            logger.error(f"Periodic task 错误: {e}")
+            if git_pull():
+                logger.info(
+                    "源代码已更新，配置文件将在本次生成时重新读取（代码改动需重启服务后生效）"
+                )
+            stopwatch = worker.run()
+            logger.success(f"日历生成完毕，共耗时 {stopwatch.total:.2f}s: {stopwatch.summary()}")
+        except (Exception, SystemExit) as e:
+            logger.error(f"Periodic task 错误: {e!r}")
         logger.info(f"等待 {INTERVAL} 秒后再次执行任务...")
         time.sleep(INTERVAL)
 
 
+def reload_config(worker: CalendarWorker, name: str = "") -> None:
+    prefix = f"[{name}] " if name else ""
+    try:
+        stopwatch = worker.reload()
+        if stopwatch is not None:
+            logger.success(f"{prefix}已按新配置重新生成日历，共耗时 {stopwatch.total:.2f}s")
+    except (Exception, SystemExit) as e:
+        logger.error(f"{prefix}按新配置重新生成日历失败: {e!r}")
+
+
+def watch_configs(args: argparse.Namespace, workers: list[tuple[str, CalendarWorker]]) -> None:
+    if args.watch_interval <= 0:
+        return
+
+    def watched() -> set[str]:
+        return set().union(*(worker.watchedPaths() for _, worker in workers))
+
+    def reload_changed(changed: set[str]) -> None:
+        # 只重新生成读取了发生变化的配置文件的日历
+        for name, worker in workers:
+            if changed & worker.watchedPaths():
+                reload_config(worker, name)
+
+    ConfigWatcher(watched, interval=args.watch_interval).start(reload_changed)
+
+
+def serve_cache(cache: CalendarCache) -> Response:
+    # 刷新在后台进行，这里总是直接返回最近一个成功生成的版本
+    version = cache.version
+    if version is None:
+        return Response("日历尚未生成，请稍后再试", status=503, mimetype="text/plain")
+    # 按 Accept-Encoding 选择预压缩的版本，质量相同时优先 br
+    offers = [e for e in ("br", "gzip") if e in version.variants] + ["identity"]
+    encoding = request.accept_encodings.best_match(offers)
+    content, etag = version.encoded(encoding)
+    response = Response(content, mimetype="text/calendar")
+    if content is not version.content:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(etag)
+    response.last_modified = version.lastModified
+    age = cache.age
+    if age is not None:
+        response.headers["X-Calendar-Age"] = str(int(age))
+    return response.make_conditional(request)
+
+
+@app.before_request
+def start_timer():
+    g.begin = time.perf_counter()
+
+
+@app.after_request
+def record_request(response: Response) -> Response:
+    # 按路由模板统计，订阅链接中的 token 不会出现在标签里
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_SECONDS.observe(time.perf_counter() - g.begin, route=route)
+    HTTP_REQUESTS.inc(route=route, status=str(response.status_code))
+    return response
+
+
+@app.route("/metrics")
+def serve_metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/zjuical.ics")
 def serve_file():
-    with open("zjuical.ics", encoding="utf-8") as f:
-        content = f.read()
-    return Response(content, mimetype="text/calendar")
+    return serve_cache(cache)
+
+
+@app.route("/u/<token>.ics")
+def serve_tenant(token: str):
+    tenant = tenants.get(token)
+    if tenant is None:
+        abort(404)
+    return serve_cache(tenant.worker.cache)
+
+
+def run_single(args: argparse.Namespace) -> None:
+    logger.info(f"日历访问地址为 http://{args.host}:{args.port}/zjuical.ics")
+
+    zjuicalArgs = parseZjuicalArgs(args.zjuical)
+    Event.uidHash = zjuicalArgs.uid_hash
+    worker = CalendarWorker(zjuicalArgs, cache, output=zjuicalArgs.output)
+    # 启动时先读取一次配置，配置有误时直接退出
+    loadConfig(zjuicalArgs, worker.config)
+    worker.loadExisting()
+
+    t = threading.Thread(target=periodic_task, daemon=True, args=(worker,))
+    t.start()
+    watch_configs(args, [("", worker)])
+
+
+def run_multi_tenant(args: argparse.Namespace) -> None:
+    tenantList = loadTenants(args.tenants)
+    # loadTenants 保证所有用户的 --uid-hash 相同
+    Event.uidHash = tenantList[0].worker.args.uid_hash
+    for tenant in tenantList:
+        loadConfig(tenant.worker.args, tenant.worker.config)
+        tenants[tenant.token] = tenant
+    logger.info(f"日历访问地址为 http://{args.host}:{args.port}/u/[token].ics")
+
+    def update() -> None:
+        if git_pull():
+            logger.info(
+                "源代码已更新，配置文件将在各用户下次生成时重新读取（代码改动需重启服务后生效）"
+            )
+
+    scheduler = RefreshScheduler(INTERVAL, args.jitter, args.workers)
+    scheduler.start(tenantList)
+    scheduler.runEvery(INTERVAL, update)
+    watch_configs(args, [(tenant.name, tenant.worker) for tenant in tenantList])
 
 
 if __name__ == "__main__":
     args = parse_args()
     logger.info(f"ZJU-ICAL-PY WEB-SERVER (v{VERSION}) by Xecades")
-    logger.info(f"日历访问地址为 http://{args.host}:{args.port}/zjuical.ics")
 
-    t = threading.Thread(target=periodic_task, daemon=True, args=(args.zjuical,))
-    t.start()
+    ZjuamSession.setConcurrency(args.max_upstream)
+    if args.tenants is None:
+        run_single(args)
+    else:
+        run_multi_tenant(args)
 
     serve(app, host="0.0.0.0", port=args.port)
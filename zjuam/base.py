@@ -1,14 +1,21 @@
 import json
-import time
 from abc import ABC, abstractmethod
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any
 
-import requests
 from loguru import logger
 
 from course.course import CourseTable
 from exam.exam import ExamTable
 from todos.todos import TodoTable
 from utils.const import Term
+from utils.metrics import CACHE_REQUESTS
+from utils.profiling import span
+from utils.ratelimit import TokenBucket
+from zjuam.response_cache import ResponseCache
+from zjuam.session import ZjuamSession
+from zjuam.session_cache import SessionCache
 
 
 class Zjuam(ABC):
@@ -16,35 +23,200 @@ class Zjuam(ABC):
     PUBKEY_URL = "https://zjuam.zju.edu.cn/cas/v2/getPubKey"
     TODOS_URL = "https://courses.zju.edu.cn/api/todos"
 
-    def __init__(self, username: str, password: str, request_delay: float = 1.5):
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        request_delay: float = 1.5,
+        sessionCache: SessionCache | None = None,
+        limiter: TokenBucket | None = None,
+        responseCache: ResponseCache | None = None,
+    ):
         self.username = username
         self.password = password
         self.request_delay = request_delay
-        self.r = requests.Session()
+        self.sessionCache = sessionCache
+        self.responseCache = responseCache
+        # 数据请求之间的限速，默认每 request_delay 秒一次
+        self.limiter = limiter if limiter is not None else TokenBucket(request_delay)
+        self.r = ZjuamSession()
+        self.loggedIn = False  # self.r 中是否有登录成功过的会话
 
-    @abstractmethod
     def login(self) -> None:
+        """
+        优先复用缓存的会话，会话被拒绝时才完整登录
+        """
+        if self.sessionCache is not None and self.restoreSession():
+            self.loggedIn = True
+            return
+
+        self.relogin()
+
+    def keepAlive(self) -> None:
+        """
+        用于长期运行的进程：优先复用进程内已登录的会话，服务器拒绝时才完整登录。
+        尚未登录过时同 login
+        """
+        if not self.loggedIn:
+            self.login()
+            return
+
+        try:
+            valid = self.validateSession()
+        except Exception as e:
+            logger.warning(f"当前会话校验失败: {e}")
+            valid = False
+
+        if valid:
+            logger.success("复用当前的登录会话")
+            return
+        logger.info("当前会话已失效，重新登录")
+        self.relogin()
+
+    def relogin(self) -> None:
+        self.loggedIn = False
+        self.loginWithPassword()
+        self.loggedIn = True
+
+        if self.sessionCache is not None:
+            self.sessionCache.save(self.username, self.password, self.exportSession())
+
+    @abstractmethod
+    def loginWithPassword(self) -> None:
         pass
 
     @abstractmethod
-    def getCourses(self, year: str, term: Term, exams: ExamTable) -> CourseTable:
+    def validateSession(self) -> bool:
+        """
+        用一次轻量请求检查当前会话是否仍然有效
+        """
         pass
 
+    def exportSession(self) -> dict:
+        cookies = [
+            {
+                "name": c.name,
+                "value": c.value,
+                "domain": c.domain,
+                "path": c.path,
+                "expires": c.expires,
+                "secure": c.secure,
+            }
+            for c in self.r.cookies
+        ]
+        return {"cookies": cookies}
+
+    def importSession(self, state: dict) -> None:
+        self.r.cookies.clear()
+        for c in state["cookies"]:
+            self.r.cookies.set(
+                c["name"],
+                c["value"],
+                domain=c["domain"],
+                path=c["path"],
+                expires=c["expires"],
+                secure=c["secure"],
+            )
+
+    def restoreSession(self) -> bool:
+        assert self.sessionCache is not None
+        state = self.sessionCache.load(self.username, self.password)
+        if state is None:
+            CACHE_REQUESTS.inc(cache="session", result="miss")
+            return False
+
+        self.importSession(state)
+        try:
+            valid = self.validateSession()
+        except Exception as e:
+            logger.warning(f"缓存的会话校验失败: {e}")
+            valid = False
+
+        if not valid:
+            logger.info("缓存的会话已失效，重新登录")
+            CACHE_REQUESTS.inc(cache="session", result="miss")
+            return False
+        logger.success("复用缓存的登录会话")
+        CACHE_REQUESTS.inc(cache="session", result="hit")
+        return True
+
     @abstractmethod
-    def getExams(self) -> ExamTable:
+    def fetchCourses(self, year: str, term: Term) -> Any:
+        """
+        获取某学期课程的原始数据
+        """
         pass
 
-    def getTodos(self) -> TodoTable:
+    @abstractmethod
+    def parseCourses(self, raw: Any, exams: ExamTable) -> CourseTable:
+        pass
+
+    def getCourses(
+        self, year: str, term: Term, exams: ExamTable, closedSince: datetime | None = None
+    ) -> CourseTable:
+        """
+        closedSince 为学期结束时间，在此之后获取的课程数据不会再变化，可永久复用
+        """
+        raw = self.cached(
+            ("courses", year, term.value), lambda: self.fetchCourses(year, term), closedSince
+        )
+        with span("parse"):
+            return self.parseCourses(raw, exams)
+
+    def cached(
+        self, key: tuple[str, ...], fetch: Callable[[], Any], closedSince: datetime | None = None
+    ) -> Any:
+        """
+        优先从 responseCache 读取原始数据，未命中时调用 fetch 获取并写入缓存
+        """
+        if self.responseCache is None:
+            with span("fetch"):
+                return fetch()
+
+        key = (self.username, *key)
+        with span("readCache") as node:
+            raw = self.responseCache.get(key, closedSince)
+            if node is not None:
+                node.attrs["hit"] = raw is not None
+        if raw is not None:
+            logger.info(f"使用缓存的{'/'.join(key[1:])}数据")
+            CACHE_REQUESTS.inc(cache="response", result="hit")
+            return raw
+        CACHE_REQUESTS.inc(cache="response", result="miss")
+        if self.responseCache.offline:
+            raise LookupError(f"离线模式下缺少{'/'.join(key[1:])}的缓存数据，请先在线运行一次")
+
+        with span("fetch"):
+            raw = fetch()
+        with span("writeCache"):
+            self.responseCache.put(key, raw)
+        return raw
+
+    @abstractmethod
+    def fetchExams(self) -> Any:
+        """
+        获取考试信息的原始数据
+        """
+        pass
+
+    @abstractmethod
+    def parseExams(self, raw: Any) -> ExamTable:
+        pass
+
+    def getExams(self) -> ExamTable:
+        raw = self.cached(("exams",), self.fetchExams)
+        with span("parse"):
+            return self.parseExams(raw)
+
+    def fetchTodos(self) -> list[dict]:
         # /api/todos is shared between ugrs and grs
         logger.info("开始获取待办事项信息")
         res = None
         try:
-            time.sleep(self.request_delay)
+            self.limiter.acquire()
             res = self.r.get(self.TODOS_URL)
             content = res.json()
             todo_list = content.get("todo_list", [])
-            tt = TodoTable()
-            tt.fromRes(todo_list)
         except json.JSONDecodeError as e:
             logger.error(f"待办事项信息获取失败: {e}")
             if res is not None:
@@ -54,4 +226,14 @@ class Zjuam(ABC):
             logger.error(f"待办事项信息获取失败: {e}")
             raise e
         logger.success(f"待办事项信息获取成功，共 {len(todo_list)} 项")
+        return todo_list
+
+    def parseTodos(self, raw: list[dict]) -> TodoTable:
+        tt = TodoTable()
+        tt.fromRes(raw)
         return tt
+
+    def getTodos(self) -> TodoTable:
+        raw = self.cached(("todos",), self.fetchTodos)
+        with span("parse"):
+            return self.parseTodos(raw)
@@ -1,6 +1,5 @@
 # Graduate Students
 import re
-import time
 from urllib.parse import parse_qs, urlparse
 
 from loguru import logger
@@ -9,7 +8,10 @@ from course.convert import grsClassTermToQueryString, grsGetYear
 from course.grs_course import GRSCourseTable
 from exam.exam import ExamTable
 from utils.const import Term
+from utils.ratelimit import TokenBucket
 from zjuam.base import Zjuam
+from zjuam.response_cache import ResponseCache
+from zjuam.session_cache import SessionCache
 
 
 class GrsZjuam(Zjuam):
@@ -19,12 +21,39 @@ class GrsZjuam(Zjuam):
     YJSY_LOGIN_URL = "https://zjuam.zju.edu.cn/cas/login?service=https%3A%2F%2Fyjsy.zju.edu.cn%2F"
     YJSY_TOKEN_URL = "https://yjsy.zju.edu.cn/dataapi/sys/cas/client/validateLogin?service=https:%2F%2Fyjsy.zju.edu.cn%2F"
 
-    def __init__(self, username: str, password: str, request_delay: float = 1.5):
-        super().__init__(username, password, request_delay)
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        request_delay: float = 1.5,
+        sessionCache: SessionCache | None = None,
+        limiter: TokenBucket | None = None,
+        responseCache: ResponseCache | None = None,
+    ):
+        super().__init__(username, password, request_delay, sessionCache, limiter, responseCache)
+
+    def exportSession(self) -> dict:
+        state = super().exportSession()
+        state["token"] = self._token
+        return state
+
+    def importSession(self, state: dict) -> None:
+        super().importSession(state)
+        self._token = state["token"]
+
+    def validateSession(self) -> bool:
+        res = self.r.post(self.INFO_URL, headers={"X-Access-Token": self._token})
+        try:
+            return bool(res.json().get("success"))
+        except ValueError:
+            return False
 
-    def login(self) -> None:
+    def loginWithPassword(self) -> None:
         logger.info("开始通过 ZJUAM 研究生途径登录")
 
+        # 会话可能被复用，清空上一次登录留下的 Cookie，确保从 CAS 登录页开始
+        self.r.cookies.clear()
+
         # stage 1: get csrf key
         try:
             res = self.r.get(self.YJSY_LOGIN_URL)
@@ -115,33 +144,43 @@ class GrsZjuam(Zjuam):
             raise e
         logger.success("YJSY 登录成功")
 
-    def getCourses(self, year: str, term: Term, exams: ExamTable) -> GRSCourseTable:
+    def fetchCourses(self, year: str, term: Term) -> dict:
         logger.info(f"开始获取[{year}-{term.value}]课程信息")
         try:
             year = grsGetYear(year, term)
             termQuery = grsClassTermToQueryString(term)
-            time.sleep(self.request_delay)
+            self.limiter.acquire()
 
             courseUrl = self.COURSE_URL + f"xn={year}&pkxq={termQuery}"
             res = self.r.get(courseUrl, headers={"X-Access-Token": self._token}).json()
             assert res.get("success"), "课程信息获取失败"
-            res = res["result"]["kcbMap"]
-            ct = GRSCourseTable()
-            ct.fromRes(res)
-            ct.deDup()
+            kcbMap = res["result"]["kcbMap"]
 
             res = self.r.post(self.INFO_URL, headers={"X-Access-Token": self._token}).json()
             assert res.get("success"), "课程附加信息获取失败"
-            res = res["result"]["xxjhnList"]
-            ct.grsGetInfo(res)
+            xxjhnList = res["result"]["xxjhnList"]
 
         except Exception as e:
             logger.error(f"课程信息获取失败: {e}")
             raise e
         logger.success(f"[{year}-{term.value}]课程信息获取成功")
+        return {"kcbMap": kcbMap, "xxjhnList": xxjhnList}
+
+    def parseCourses(self, raw: dict, exams: ExamTable) -> GRSCourseTable:
+        try:
+            ct = GRSCourseTable()
+            ct.fromRes(raw["kcbMap"])
+            ct.deDup()
+            ct.grsGetInfo(raw["xxjhnList"])
+        except Exception as e:
+            logger.error(f"课程信息解析失败: {e}")
+            raise e
         return ct
 
     # TODO: implement exam fetching for graduate system
-    def getExams(self, count: int = 5000) -> ExamTable:
+    def fetchExams(self, count: int = 5000) -> list[dict]:
         logger.warning("研究生系统暂未适配考试信息查询")
+        return []
+
+    def parseExams(self, raw: list[dict]) -> ExamTable:
         return ExamTable()  # empty exam table
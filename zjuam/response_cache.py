@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Any
+
+
+class ResponseCache:
+    """
+    按内容寻址保存上游返回的原始数据：objects/ 下以内容的 SHA-256 命名，
+    refs/ 下以键的 SHA-256 命名并记录对应的对象和获取时间
+    """
+
+    def __init__(self, directory: str, ttl: float = 0, offline: bool = False):
+        self.directory = directory
+        self.ttl = ttl  # 未结束学期等可变数据的有效期（秒）
+        self.offline = offline  # 离线模式下忽略有效期，只读取已有数据
+        os.makedirs(os.path.join(directory, "objects"), mode=0o700, exist_ok=True)
+        os.makedirs(os.path.join(directory, "refs"), mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def _digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _refPath(self, key: tuple[str, ...]) -> str:
+        name = self._digest("\0".join(key).encode())
+        return os.path.join(self.directory, "refs", f"{name}.json")
+
+    def _objectPath(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", f"{digest}.json")
+
+    def _write(self, path: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key: tuple[str, ...], closedSince: datetime | None = None) -> Any | None:
+        """
+        读取缓存，closedSince 之后获取的数据视为不可变、永久有效，
+        其余数据在 ttl 秒内有效（离线模式下始终有效），未命中时返回 None
+        """
+        refPath = self._refPath(key)
+        if not os.path.exists(refPath):
+            return None
+        with open(refPath, encoding="utf-8") as f:
+            ref = json.load(f)
+
+        fetchedAt: float = ref["fetchedAt"]
+        immutable = closedSince is not None and fetchedAt >= closedSince.timestamp()
+        if not immutable and not self.offline and time.time() - fetchedAt >= self.ttl:
+            return None
+
+        objectPath = self._objectPath(ref["object"])
+        if not os.path.exists(objectPath):
+            return None
+        with open(objectPath, encoding="utf-8") as f:
+            return json.load(f)
+
+    def put(self, key: tuple[str, ...], payload: Any) -> None:
+        data = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode()
+        digest = self._digest(data)
+        objectPath = self._objectPath(digest)
+        if not os.path.exists(objectPath):
+            self._write(objectPath, data)
+        ref = {"object": digest, "fetchedAt": time.time()}
+        self._write(self._refPath(key), json.dumps(ref).encode())
@@ -0,0 +1,48 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+from utils.metrics import UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+from utils.profiling import span
+
+
+class ZjuamSession(requests.Session):
+    """
+    所有上游请求的出口，可设置进程内所有会话共享的最大并发请求数，
+    并按 URL（不含查询参数）统计请求数和耗时
+    """
+
+    _semaphore: threading.BoundedSemaphore | None = None
+
+    @classmethod
+    def setConcurrency(cls, limit: int | None) -> None:
+        cls._semaphore = threading.BoundedSemaphore(limit) if limit else None
+
+    def request(self, method, url, *args, **kwargs) -> requests.Response:
+        semaphore = ZjuamSession._semaphore
+        if semaphore is None:
+            return self._timedRequest(method, url, *args, **kwargs)
+        with semaphore:
+            return self._timedRequest(method, url, *args, **kwargs)
+
+    def _timedRequest(self, method, url, *args, **kwargs) -> requests.Response:
+        parts = urlsplit(url)
+        endpoint = f"{parts.scheme}://{parts.netloc}{parts.path}"
+        status = "error"
+        begin = time.perf_counter()
+        try:
+            with span("http", method=method, url=endpoint) as node:
+                res = super().request(method, url, *args, **kwargs)
+                status = str(res.status_code)
+                if node is not None:
+                    node.attrs.update(
+                        status=res.status_code,
+                        sent=len(res.request.body or b""),
+                        received=len(res.content),
+                    )
+            return res
+        finally:
+            UPSTREAM_SECONDS.observe(time.perf_counter() - begin, url=endpoint)
+            UPSTREAM_REQUESTS.inc(url=endpoint, status=status)
@@ -0,0 +1,79 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+
+from cryptography.fernet import Fernet, InvalidToken
+from loguru import logger
+
+
+class SessionCache:
+    """
+    按账号将登录会话（Cookie、YJSY token 等）加密保存到磁盘，
+    密钥由账号密码派生，超过 ttl 秒的会话视为过期
+    """
+
+    KDF_ITERATIONS = 200_000
+    SALT_SIZE = 16
+
+    def __init__(self, directory: str, ttl: int = 12 * 60 * 60):
+        self.directory = directory
+        self.ttl = ttl
+        # (username, 密码摘要) -> (salt, fernet)，密码变化后不会复用旧密钥
+        self._keys: dict[tuple[str, bytes], tuple[bytes, Fernet]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, username: str) -> str:
+        name = hashlib.sha256(username.encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.session")
+
+    @staticmethod
+    def _memoKey(username: str, password: str) -> tuple[str, bytes]:
+        return username, hashlib.sha256(password.encode()).digest()
+
+    def _fernet(self, username: str, password: str, salt: bytes) -> Fernet:
+        memoKey = self._memoKey(username, password)
+        with self._lock:
+            cached = self._keys.get(memoKey)
+            if cached is not None and cached[0] == salt:
+                return cached[1]
+        key = hashlib.pbkdf2_hmac(
+            "sha256", password.encode(), salt + username.encode(), self.KDF_ITERATIONS
+        )
+        fernet = Fernet(base64.urlsafe_b64encode(key))
+        with self._lock:
+            self._keys[memoKey] = (salt, fernet)
+        return fernet
+
+    def load(self, username: str, password: str) -> dict | None:
+        path = self._path(username)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            salt, token = raw[: self.SALT_SIZE], raw[self.SALT_SIZE :]
+            data = self._fernet(username, password, salt).decrypt(token, ttl=self.ttl)
+            return json.loads(data)
+        except InvalidToken:
+            logger.info("缓存的会话已过期或无法解密")
+            self.remove(username)
+            return None
+
+    def save(self, username: str, password: str, state: dict) -> None:
+        with self._lock:
+            cached = self._keys.get(self._memoKey(username, password))
+        salt = cached[0] if cached is not None else os.urandom(self.SALT_SIZE)
+        token = self._fernet(username, password, salt).encrypt(json.dumps(state).encode())
+
+        path = self._path(username)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(salt + token)
+
+    def remove(self, username: str) -> None:
+        path = self._path(username)
+        if os.path.exists(path):
+            os.remove(path)
@@ -9,7 +9,10 @@ from course.convert import ugrsClassTermToQueryString
 from course.ugrs_course import UGRSCourseTable
 from exam.exam import ExamTable
 from utils.const import Term
+from utils.ratelimit import TokenBucket
 from zjuam.base import Zjuam
+from zjuam.response_cache import ResponseCache
+from zjuam.session_cache import SessionCache
 
 
 class UgrsZjuam(Zjuam):
@@ -17,12 +20,34 @@ class UgrsZjuam(Zjuam):
     EXAM_URL = "https://zdbk.zju.edu.cn/jwglxt/xskscx/kscx_cxXsgrksIndex.html?doType=query&gnmkdm=N509070&su=%s"  # gnmkdm=功能模块代码
     ZDBK_LOGIN_URL = "https://zjuam.zju.edu.cn/cas/login?service=https%3A%2F%2Fzdbk.zju.edu.cn%2Fjwglxt%2Fxtgl%2Flogin_ssologin.html"
 
-    def __init__(self, username: str, password: str, request_delay: float = 1.5):
-        super().__init__(username, password, request_delay)
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        request_delay: float = 1.5,
+        sessionCache: SessionCache | None = None,
+        limiter: TokenBucket | None = None,
+        responseCache: ResponseCache | None = None,
+    ):
+        super().__init__(username, password, request_delay, sessionCache, limiter, responseCache)
 
-    def login(self) -> None:
+    def validateSession(self) -> bool:
+        # 会话失效时会被重定向到登录页，返回的不是 JSON
+        res = self.r.post(
+            self.EXAM_URL % self.username,
+            data={"queryModel.showCount": "1", "queryModel.currentPage": "1"},
+        )
+        try:
+            return "items" in res.json()
+        except json.JSONDecodeError:
+            return False
+
+    def loginWithPassword(self) -> None:
         logger.info("开始通过 ZJUAM 本科生途径登录")
 
+        # 会话可能被复用，清空上一次登录留下的 Cookie，确保从 CAS 登录页开始
+        self.r.cookies.clear()
+
         # stage 1: get csrf key
         try:
             res = self.r.get(self.ZDBK_LOGIN_URL)
@@ -72,12 +97,12 @@ class UgrsZjuam(Zjuam):
             raise e
         logger.success("ZJUAM 登录成功")
 
-    def getCourses(self, year: str, term: Term, exams: ExamTable) -> UGRSCourseTable:
+    def fetchCourses(self, year: str, term: Term) -> list[dict]:
         logger.info(f"开始获取[{year}-{term.value}]课程信息")
         res = None
         try:
             termQuery = ugrsClassTermToQueryString(term)
-            time.sleep(self.request_delay)
+            self.limiter.acquire()
             res = self.r.post(
                 self.COURSE_URL,
                 data={"xnm": year, "xqm": termQuery},
@@ -85,10 +110,6 @@ class UgrsZjuam(Zjuam):
             content = res.json()
 
             kblist = content["kbList"]
-            ct = UGRSCourseTable()
-            ct.fromRes(kblist)
-            ct.merge()
-            ct.communicate(exams)
         except json.JSONDecodeError as e:
             logger.error(f"课程信息获取失败: {e}")
             if res is not None:
@@ -98,9 +119,20 @@ class UgrsZjuam(Zjuam):
             logger.error(f"课程信息获取失败: {e}")
             raise e
         logger.success(f"[{year}-{term.value}]课程信息获取成功")
+        return kblist
+
+    def parseCourses(self, raw: list[dict], exams: ExamTable) -> UGRSCourseTable:
+        try:
+            ct = UGRSCourseTable()
+            ct.fromRes(raw)
+            ct.merge()
+            ct.communicate(exams)
+        except Exception as e:
+            logger.error(f"课程信息解析失败: {e}")
+            raise e
         return ct
 
-    def getExams(self, count: int = 5000) -> ExamTable:
+    def fetchExams(self, count: int = 5000) -> list[dict]:
         logger.info("开始获取考试信息")
         res = None
         try:
@@ -118,8 +150,6 @@ class UgrsZjuam(Zjuam):
             )
             content = res.json()
             items = content["items"]
-            et = ExamTable()
-            et.fromZdbk(items)
         except json.JSONDecodeError as e:
             logger.error(f"考试信息获取失败: {e}")
             if res is not None:
@@ -129,4 +159,9 @@ class UgrsZjuam(Zjuam):
             logger.error(f"考试信息获取失败: {e}")
             raise e
         logger.success("考试信息获取成功")
+        return items
+
+    def parseExams(self, raw: list[dict]) -> ExamTable:
+        et = ExamTable()
+        et.fromZdbk(raw)
         return et
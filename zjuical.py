@@ -1,15 +1,34 @@
 import argparse
+import contextlib
 import os
 
 from loguru import logger
 
+from ical.ical import UID_HASHES, Event
 from main.integration import getCalender
+from utils.atomic import atomicWrite
 from utils.config import config
+from utils.profiling import Profiler
+from utils.timing import Stopwatch
+from zjuam.response_cache import ResponseCache
+from zjuam.session_cache import SessionCache
 
 VERSION = "1.1.0"
 
-if __name__ == "__main__":
 
+def createSessionCache(args: argparse.Namespace) -> SessionCache | None:
+    if args.session_cache is None:
+        return None
+    return SessionCache(args.session_cache, args.session_ttl)
+
+
+def createResponseCache(args: argparse.Namespace) -> ResponseCache | None:
+    if args.cache_dir is None:
+        return None
+    return ResponseCache(args.cache_dir, args.cache_ttl, args.offline)
+
+
+def build_parser() -> argparse.ArgumentParser:
     def formatter(prog):
         return argparse.HelpFormatter(prog, max_help_position=52)
 
@@ -34,8 +53,7 @@ if __name__ == "__main__":
         "-p",
         "--password",
         type=str,
-        required=True,
-        help="ZJUAM password",
+        help="ZJUAM password (not needed with --offline)",
     )
     parse(
         "-c",
@@ -75,11 +93,77 @@ if __name__ == "__main__":
         default=1.5,
         help="delay between requests in seconds (default 1.5)",
     )
+    parse(
+        "-j",
+        "--jobs",
+        type=int,
+        default=4,
+        help="number of terms fetched concurrently, also the burst size of the --delay rate limit (default 4)",
+    )
     parse(
         "--include-todos",
         action="store_true",
         help="include todos (homework deadlines) in the calendar",
     )
+    parse(
+        "--rrule",
+        action="store_true",
+        help="emit one recurring event (RRULE) per course instead of one event per class",
+    )
+    parse(
+        "--deterministic",
+        action="store_true",
+        help="take event timestamps from the config instead of the current time, "
+        "so unchanged schedules produce byte-identical files",
+    )
+    parse(
+        "--uid-hash",
+        type=str,
+        choices=list(UID_HASHES),
+        default="sha1",
+        help='hash used for event UIDs (default "sha1"), changing it makes clients re-import all events',
+    )
+    parse(
+        "--session-cache",
+        type=str,
+        help="directory for the encrypted login session cache, sessions are reused until rejected",
+    )
+    parse(
+        "--session-ttl",
+        type=int,
+        default=12 * 60 * 60,
+        help="max age in seconds of a cached login session (default 43200)",
+    )
+    parse(
+        "--cache-dir",
+        type=str,
+        help="directory for caching raw course data, data of finished terms is never refetched",
+    )
+    parse(
+        "--cache-ttl",
+        type=float,
+        default=0,
+        help="seconds for which cached data of ongoing terms is reused (default 0)",
+    )
+    parse(
+        "--offline",
+        action="store_true",
+        help="rebuild the calendar from data recorded in --cache-dir without logging in",
+    )
+    parse(
+        "--profile",
+        type=str,
+        metavar="PATH",
+        help="record a span tree of all stages and upstream requests and write it to PATH as JSON",
+    )
+    parse(
+        "--profile-with",
+        choices=["cprofile", "tracemalloc"],
+        action="append",
+        default=[],
+        help="also write a cProfile (.prof) or tracemalloc (.tracemalloc) dump next to "
+        "--profile, may be repeated",
+    )
     parse(
         "-v",
         "--version",
@@ -88,7 +172,25 @@ if __name__ == "__main__":
         help="version for zjuical",
     )
 
-    args = parser.parse_args()
+    return parser
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.offline:
+        if args.cache_dir is None:
+            parser.error("--offline requires --cache-dir")
+        args.password = args.password or ""
+    elif args.password is None:
+        parser.error("the following arguments are required: -p/--password")
+    if args.profile_with and args.profile is None:
+        parser.error("--profile-with requires --profile")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
 
     logger.info(f"ZJU-ICAL-PY (v{VERSION}) by Xecades")
 
@@ -99,21 +201,43 @@ if __name__ == "__main__":
         else:
             logger.warning(f"输出文件 {args.output} 已存在，将被覆盖")
 
+    Event.uidHash = args.uid_hash
+
     if args.all:
         logger.info("使用 --all 模式，将生成所有配置文件的日历")
-        config.loadAll()
+        snapshot = config.loadAll()
     else:
-        config.load(args.config)
+        snapshot = config.load(args.config)
 
-    cal = getCalender(
-        args.username,
-        args.password,
-        args.skip_verification_and_use,
-        args.delay,
-        args.include_todos,
-    )
-    with open(args.output, "w", encoding="utf-8") as f:
-        logger.info(f"正在写入文件 {args.output}")
-        f.write(cal)
+    profiler = None
+    if args.profile is not None:
+        profiler = Profiler(
+            "zjuical",
+            useCProfile="cprofile" in args.profile_with,
+            useTracemalloc="tracemalloc" in args.profile_with,
+        )
+
+    stopwatch = Stopwatch()
+    with profiler or contextlib.nullcontext():
+        cal = getCalender(
+            args.username,
+            args.password,
+            args.skip_verification_and_use,
+            args.delay,
+            args.include_todos,
+            args.rrule,
+            args.deterministic,
+            stopwatch,
+            createSessionCache(args),
+            args.jobs,
+            createResponseCache(args),
+            snapshot,
+        )
+        with atomicWrite(args.output, "w", encoding="utf-8") as f, stopwatch.stage("toICS"):
+            logger.info(f"正在写入文件 {args.output}")
+            cal.writeICS(f)
 
+    logger.info(f"各阶段耗时: {stopwatch.summary()}")
+    if profiler is not None:
+        profiler.dump(args.profile)
     logger.success("日历文件生成完毕")